@@ -50,25 +50,25 @@ def demo_basic_operations():
             ("user", "My favorite color is blue"),
         ]
         
-        for role, content in memories_to_save:
-            try:
-                msg_id = engine.save_message(
-                    role=role,
-                    content=content,
-                    conversation_id="demo",
-                    generate_embedding=True  # Will use real embeddings if API key is set
-                )
-                print(f"   ✅ Saved: {content[:50]}... (ID: {msg_id})")
-            except Exception as e:
-                print(f"   ⚠️  Skipped embedding generation: {str(e)[:50]}")
-                # Save without embedding
-                msg_id = engine.save_message(
-                    role=role,
-                    content=content,
-                    conversation_id="demo",
-                    generate_embedding=False
-                )
-                print(f"   ✅ Saved (no embedding): {content[:50]}...")
+        messages = [
+            {"role": role, "content": content, "conversation_id": "demo"}
+            for role, content in memories_to_save
+        ]
+        
+        # One embeddings request and one transaction for the whole batch
+        try:
+            msg_ids = engine.save_messages(
+                messages,
+                generate_embeddings=True  # Will use real embeddings if API key is set
+            )
+            label = "Saved"
+        except Exception as e:
+            print(f"   ⚠️  Skipped embedding generation: {str(e)[:50]}")
+            # Save without embeddings
+            msg_ids = engine.save_messages(messages, generate_embeddings=False)
+            label = "Saved (no embedding)"
+        
+        print(f"   ✅ {label} {len(msg_ids)} memories (IDs {msg_ids[0]}-{msg_ids[-1]})")
         
         print("\n3️⃣  Getting conversation history...")
         history = engine.get_conversation_history("demo")
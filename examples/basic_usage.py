@@ -35,12 +35,13 @@ def main():
         ("assistant", "PyTorch is excellent for research. Blue is a calming color!"),
     ]
     
-    for role, content in messages:
-        msg_id = engine.save_message(
-            role=role,
-            content=content,
-            conversation_id="example_conversation"
-        )
+    # Embed all messages in one API call and save them in a single transaction
+    msg_ids = engine.save_messages([
+        {"role": role, "content": content, "conversation_id": "example_conversation"}
+        for role, content in messages
+    ])
+    
+    for msg_id, (role, content) in zip(msg_ids, messages):
         print(f"   ✓ Saved message {msg_id}: {content[:50]}...")
     
     # Retrieve relevant memories
@@ -4,15 +4,28 @@ Batch import example for Mini Memori.
 Shows how to import existing conversations or data into the memory system.
 """
 
-from mini_memori import MemoryEngine
+from mini_memori import MemoryEngine, Message
 from mini_memori.config import setup_logging
 import json
+import sys
 from typing import List, Dict, Any
 
-setup_logging("INFO")
+try:
+    import ijson  # Optional: streams large files instead of loading them whole
+except ImportError:
+    ijson = None
 
+# Bulk imports only log warnings; progress is printed instead
+setup_logging("WARNING")
 
-def import_from_json(engine: MemoryEngine, json_file: str, conversation_id: str):
+
+def import_from_json(
+    engine: MemoryEngine,
+    json_file: str,
+    conversation_id: str,
+    chunk_size: int = 1000,
+    verbose: bool = True
+):
     """
     Import messages from a JSON file.
     
@@ -22,22 +35,35 @@ def import_from_json(engine: MemoryEngine, json_file: str, conversation_id: str)
         {"role": "assistant", "content": "response", "metadata": {}},
         ...
     ]
+    
+    Messages are saved in chunks of chunk_size (one embeddings request and
+    one transaction each). With ijson installed the file is streamed, so
+    memory use stays bounded by the chunk size. With verbose, progress is
+    redrawn on a single line once per chunk.
     """
     print(f"\n📥 Importing from {json_file}...")
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        messages = json.load(f)
+    count = 0
+    chunk = []
+    with open(json_file, 'rb') as f:
+        messages = ijson.items(f, 'item', use_float=True) if ijson else json.load(f)
+        
+        for msg in messages:
+            chunk.append(Message(msg['role'], msg['content'], conversation_id, msg.get('metadata')))
+            if len(chunk) >= chunk_size:
+                count += len(engine.save_messages(chunk))
+                chunk = []
+                if verbose:
+                    sys.stdout.write(f"\r   ✓ {count} messages imported")
+                    sys.stdout.flush()
+    
+    if chunk:
+        count += len(engine.save_messages(chunk))
     
-    for i, msg in enumerate(messages, 1):
-        engine.save_message(
-            role=msg['role'],
-            content=msg['content'],
-            conversation_id=conversation_id,
-            metadata=msg.get('metadata')
-        )
-        print(f"   ✓ Imported message {i}/{len(messages)}")
+    if verbose and count >= chunk_size:
+        sys.stdout.write("\n")
     
-    print(f"✅ Successfully imported {len(messages)} messages!")
+    print(f"✅ Successfully imported {count} messages!")
 
 
 def import_conversation_pairs(
@@ -53,24 +79,13 @@ def import_conversation_pairs(
     """
     print(f"\n📥 Importing {len(conversations)} conversation pairs...")
     
-    count = 0
-    for i, pair in enumerate(conversations, 1):
-        # Save user message
-        engine.save_message(
-            role="user",
-            content=pair['user'],
-            conversation_id=conversation_id
-        )
-        
-        # Save assistant response
-        engine.save_message(
-            role="assistant",
-            content=pair['assistant'],
-            conversation_id=conversation_id
-        )
-        
-        count += 2
-        print(f"   ✓ Imported pair {i}/{len(conversations)}")
+    # Build user/assistant rows, then embed and save them in one batch
+    messages = []
+    for pair in conversations:
+        messages.append(Message("user", pair['user'], conversation_id))
+        messages.append(Message("assistant", pair['assistant'], conversation_id))
+    
+    count = len(engine.save_messages(messages))
     
     print(f"✅ Successfully imported {count} messages!")
 
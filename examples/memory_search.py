@@ -33,8 +33,10 @@ def main():
         ("user", "I'm interested in neural networks", "tech"),
     ]
     
-    for role, content, conv_id in sample_data:
-        engine.save_message(role, content, conversation_id=conv_id)
+    engine.save_messages([
+        {"role": role, "content": content, "conversation_id": conv_id}
+        for role, content, conv_id in sample_data
+    ])
     
     print(f"   ✓ Added {len(sample_data)} messages")
     
@@ -104,6 +106,13 @@ def main():
     for i, msg in enumerate(keyword_results, 1):
         print(f"   [{i}] {msg['content']}")
     
+    # Hybrid search blends keyword (BM25) and semantic scores
+    print("\n🔀 Hybrid search for 'machine learning':")
+    hybrid_results = engine.retrieve_memories("machine learning", top_k=3, hybrid=True)
+    
+    for i, mem in enumerate(hybrid_results, 1):
+        print(f"   [{i}] {mem['content']} (score: {mem['similarity']:.3f})")
+    
     # Show all conversations
     print("\n\n6. Conversation Overview")
     print("-"*60)
@@ -8,6 +8,7 @@ relevant items using OpenAI embeddings.
 from .engine import MemoryEngine
 from .database import Database
 from .embeddings import EmbeddingService
+from .utils import Message
 
 __version__ = "1.0.0"
-__all__ = ["MemoryEngine", "Database", "EmbeddingService"]
+__all__ = ["MemoryEngine", "Database", "EmbeddingService", "Message"]
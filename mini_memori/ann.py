@@ -0,0 +1,216 @@
+"""
+Approximate nearest neighbour index for Mini Memori.
+
+Wraps an hnswlib HNSW graph kept next to the SQLite database, so
+semantic search doesn't have to scan every stored embedding.
+"""
+
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+import os
+import struct
+import numpy as np
+import logging
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+class HNSWIndex:
+    """
+    Cosine-distance HNSW index of message embeddings, labelled by message ID.
+    
+    The graph is created on the first vector added, sized to its dimension,
+    and doubles its capacity whenever it fills up. The index file (if any)
+    is written on each resize and by save().
+    """
+    
+    M = 16
+    EF_CONSTRUCTION = 200
+    EF_SEARCH = 64
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize an empty index.
+        
+        Args:
+            path: File to persist the index to (None keeps it in memory only)
+        """
+        if hnswlib is None:
+            raise ImportError("hnswlib is required for HNSWIndex (pip install hnswlib)")
+            
+        self.path = path
+        self.dim: Optional[int] = None
+        self._index = None
+        self._labels: Set[int] = set()
+        
+    def load(self, dim: int) -> Set[int]:
+        """
+        Open the index for vectors of a dimension, reading the saved file if present.
+        
+        Args:
+            dim: Embedding dimension
+            
+        Returns:
+            Message IDs stored in the file (possibly including deleted ones)
+        """
+        if self.path is None or not os.path.exists(self.path):
+            self._init(dim)
+            return set()
+            
+        try:
+            # hnswlib trusts the dimension it is given, so check the file's first
+            saved_dim = self._saved_dim(self.path)
+            if saved_dim != dim:
+                raise RuntimeError(f"index holds {saved_dim}-d vectors, expected {dim}")
+            self.dim = dim
+            self._index = hnswlib.Index(space='cosine', dim=dim)
+            self._index.load_index(self.path, allow_replace_deleted=True)
+            self._index.set_ef(self.EF_SEARCH)
+        except (OSError, RuntimeError, struct.error) as e:
+            logger.warning(f"Could not read HNSW index {self.path}, rebuilding: {e}")
+            self._init(dim)
+            return set()
+            
+        self._labels = set(int(label) for label in self._index.get_ids_list())
+        logger.debug(f"Loaded HNSW index with {len(self._labels)} vectors")
+        return set(self._labels)
+        
+    @staticmethod
+    def _saved_dim(path: str) -> int:
+        """Read the vector dimension from an hnswlib index file header."""
+        with open(path, 'rb') as f:
+            header = f.read(48)
+        # Each element stores links, then the vector, then its label
+        label_offset, data_offset = struct.unpack('<QQ', header[32:48])
+        return (label_offset - data_offset) // 4
+        
+    def _init(self, dim: int) -> None:
+        """Create an empty graph for vectors of a dimension."""
+        self.dim = dim
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+        self._index.init_index(
+            max_elements=self.INITIAL_CAPACITY,
+            M=self.M,
+            ef_construction=self.EF_CONSTRUCTION,
+            allow_replace_deleted=True
+        )
+        self._index.set_ef(self.EF_SEARCH)
+        self._labels = set()
+        
+    def add(self, ids: List[int], vectors: np.ndarray) -> None:
+        """
+        Add or replace vectors.
+        
+        Vectors whose dimension differs from the index are skipped.
+        
+        Args:
+            ids: Message IDs
+            vectors: (N, d) array aligned with ids
+        """
+        if not ids:
+            return
+            
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._index is None:
+            self._init(vectors.shape[1])
+        if vectors.shape[1] != self.dim:
+            return
+            
+        # Zero vectors have no direction to index
+        keep = np.linalg.norm(vectors, axis=1) > 0
+        ids = [message_id for message_id, k in zip(ids, keep) if k]
+        if not ids:
+            return
+            
+        needed = len(self._labels | set(ids))
+        capacity = self._index.get_max_elements()
+        resized = needed > capacity
+        while capacity < needed:
+            capacity *= 2
+        if resized:
+            self._index.resize_index(capacity)
+            logger.debug(f"Resized HNSW index to {capacity} vectors")
+            
+        self._index.add_items(vectors[keep], ids, replace_deleted=True)
+        self._labels.update(ids)
+        
+        # Checkpoint at each doubling, so saves stay amortized O(1) per vector
+        if resized:
+            self.save()
+            
+    def remove(self, ids: Iterable[int]) -> None:
+        """
+        Delete vectors from the index.
+        
+        Args:
+            ids: Message IDs (unknown IDs are ignored)
+        """
+        for message_id in ids:
+            if message_id not in self._labels:
+                continue
+            try:
+                self._index.mark_deleted(message_id)
+            except RuntimeError:
+                pass  # Already deleted in a previously saved index
+            self._labels.discard(message_id)
+            
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        allowed: Optional[Set[int]] = None
+    ) -> Optional[List[Tuple[int, float]]]:
+        """
+        Find the nearest vectors to a query.
+        
+        Args:
+            query: Query vector
+            k: Number of results
+            allowed: Optional set of message IDs to restrict the search to
+            
+        Returns:
+            List of (message_id, cosine_similarity) tuples, best first, or
+            None if the index can't answer this query
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self._index is None or query.shape[0] != self.dim:
+            return None
+            
+        candidates = self._labels if allowed is None else self._labels & allowed
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+            
+        filter_fn: Optional[Callable[[int], bool]] = None
+        if allowed is not None:
+            filter_fn = candidates.__contains__
+            
+        self._index.set_ef(max(self.EF_SEARCH, k))
+        try:
+            labels, distances = self._index.knn_query(query, k=k, filter=filter_fn)
+        except RuntimeError as e:
+            # Raised when a sparse filter leaves the graph search short of k hits
+            logger.debug(f"HNSW search failed: {e}")
+            return None
+            
+        # Cosine distance is 1 - similarity
+        return [
+            (int(label), max(0.0, min(1.0, 1.0 - float(distance))))
+            for label, distance in zip(labels[0], distances[0])
+        ]
+        
+    def save(self) -> None:
+        """Write the index to its file, if it has one."""
+        if self._index is None or self.path is None:
+            return
+        self._index.save_index(self.path)
+        logger.debug(f"Saved HNSW index with {len(self._labels)} vectors")
+        
+    def __len__(self) -> int:
+        """Number of live vectors."""
+        return len(self._labels)
@@ -0,0 +1,160 @@
+"""
+In-process caches for Mini Memori.
+
+Provides a small LRU map for exact lookups and a semantic cache that
+matches queries by cosine similarity of their embeddings.
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+import numpy as np
+import logging
+from .kernels import cosine_scores
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry.
+    """
+    
+    def __init__(self, max_size: int = 128):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of entries (0 disables the cache)
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a key and mark it as recently used.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached value or None if missing
+        """
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+        
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+        
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        
+    def __len__(self) -> int:
+        """Number of cached entries."""
+        return len(self._entries)
+
+
+class SemanticCache:
+    """
+    Cache of query results keyed by embedding similarity.
+    
+    A lookup hits when a cached query with the same key has a cosine
+    similarity of at least threshold to the new query. When full, the
+    least frequently used entry is evicted, oldest first on ties.
+    """
+    
+    def __init__(self, max_size: int = 128, threshold: float = 0.97):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size: Maximum number of entries (0 disables the cache)
+            threshold: Minimum cosine similarity for a cache hit (0-1)
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self._vectors: List[np.ndarray] = []
+        self._keys: List[Hashable] = []
+        self._values: List[Any] = []
+        self._hits: List[int] = []
+        self._last_used: List[int] = []
+        self._clock = 0
+        
+    def get(self, embedding: List[float], key: Hashable = None) -> Optional[Any]:
+        """
+        Find the cached value for the most similar query with the same key.
+        
+        Args:
+            embedding: Query embedding
+            key: Extra parameters that must match exactly
+            
+        Returns:
+            Cached value or None on a miss
+        """
+        candidates = [i for i, cached_key in enumerate(self._keys) if cached_key == key]
+        if not candidates:
+            return None
+            
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.stack([self._vectors[i] for i in candidates])
+        scores = cosine_scores(matrix, query)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+            
+        index = candidates[best]
+        self._clock += 1
+        self._hits[index] += 1
+        self._last_used[index] = self._clock
+        logger.debug(f"Semantic cache hit (similarity: {scores[best]:.3f})")
+        return self._values[index]
+        
+    def put(self, embedding: List[float], key: Hashable, value: Any) -> None:
+        """
+        Store a value for a query embedding.
+        
+        Args:
+            embedding: Query embedding
+            key: Extra parameters that must match exactly on lookup
+            value: Value to store
+        """
+        if self.max_size <= 0:
+            return
+            
+        if len(self._keys) >= self.max_size:
+            victim = min(
+                range(len(self._keys)),
+                key=lambda i: (self._hits[i], self._last_used[i])
+            )
+            for entries in (self._vectors, self._keys, self._values, self._hits, self._last_used):
+                del entries[victim]
+                
+        self._clock += 1
+        self._vectors.append(np.asarray(embedding, dtype=np.float32))
+        self._keys.append(key)
+        self._values.append(value)
+        self._hits.append(0)
+        self._last_used.append(self._clock)
+        
+    def clear(self) -> None:
+        """Remove all entries."""
+        for entries in (self._vectors, self._keys, self._values, self._hits, self._last_used):
+            entries.clear()
+            
+    def __len__(self) -> int:
+        """Number of cached entries."""
+        return len(self._keys)
@@ -5,13 +5,14 @@ CLI chatbot that uses the memory engine for long-term memory.
 """
 
 import sys
+import hashlib
 import openai
 from typing import List, Dict, Any, Optional
 import logging
 from datetime import datetime
 from .engine import MemoryEngine
 from .config import get_config, setup_logging
-from .utils import format_memory_output
+from .utils import Message, format_memory_output
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +52,12 @@ class MemoriChatbot:
         self.chat_model = chat_model
         self.memory_top_k = memory_top_k
         
+        # Every conversation with the same system prompt and model shares this
+        # key, so OpenAI routes them to servers holding that prefix warm
+        self.prompt_cache_key = hashlib.sha1(
+            f"{self.get_system_prompt()}||{self.chat_model}".encode('utf-8')
+        ).hexdigest()
+        
         # Get API key from config
         config = get_config()
         openai.api_key = config.openai_api_key
@@ -64,12 +71,16 @@ class MemoriChatbot:
         """
         Get the system prompt for the chatbot.
         
+        The prompt must be identical on every turn (no timestamps or
+        memories), so OpenAI's prompt cache can match it as a prefix.
+        
         Returns:
             System prompt string
         """
         return (
             "You are a helpful AI assistant with long-term memory. "
-            "You have access to relevant memories from previous conversations. "
+            "You have access to relevant memories from previous conversations, "
+            "given after the user's message inside <memories> tags. "
             "Use these memories to provide personalized and contextually aware responses. "
             "If you reference information from memories, acknowledge it naturally."
         )
@@ -132,36 +143,21 @@ class MemoriChatbot:
             Assistant's response
         """
         try:
-            # Save user message
-            self.memory.save_message(
-                role="user",
-                content=user_message,
-                conversation_id=self.conversation_id
-            )
-            
-            # Build messages for API
+            # Build messages for API. The system prompt and history form a
+            # prefix that only grows between turns, so OpenAI's prompt cache
+            # can reuse it; per-turn memories go last
             messages = [
                 {"role": "system", "content": self.get_system_prompt()}
             ]
             
-            # Add relevant context from memory
-            if use_memory:
-                relevant_memories = self.retrieve_relevant_context(user_message)
-                if relevant_memories:
-                    context = self.format_context_for_prompt(relevant_memories)
-                    messages.append({
-                        "role": "system",
-                        "content": context
-                    })
-                    
-            # Add recent conversation history
+            # Add recent conversation history (9 prior messages, so with the
+            # current one the prompt still carries 10)
             recent_history = self.memory.get_conversation_history(
                 conversation_id=self.conversation_id,
-                limit=10
+                limit=9
             )
             
-            # Add recent messages (excluding the one we just saved)
-            for msg in recent_history[:-1]:
+            for msg in recent_history:
                 messages.append({
                     "role": msg['role'],
                     "content": msg['content']
@@ -173,22 +169,44 @@ class MemoriChatbot:
                 "content": user_message
             })
             
+            # Add relevant context from memory. Retrieval runs before the user
+            # message is stored, so it can't match itself, and the query
+            # embedding is reused from the embedding cache when saving below
+            if use_memory:
+                relevant_memories = self.retrieve_relevant_context(user_message)
+                if relevant_memories:
+                    context = self.format_context_for_prompt(relevant_memories)
+                    messages.append({
+                        "role": "user",
+                        "content": f"<memories>\n{context}\n</memories>"
+                    })
+                    
             # Call OpenAI API
-            response = openai.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            try:
+                response = openai.chat.completions.create(
+                    model=self.chat_model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    # Sent as extra_body so older openai clients pass it through too
+                    extra_body={"prompt_cache_key": self.prompt_cache_key}
+                )
+            except Exception:
+                # Keep the user's turn in memory even when there's no reply
+                self.memory.save_message(
+                    role="user",
+                    content=user_message,
+                    conversation_id=self.conversation_id
+                )
+                raise
             
             assistant_message = response.choices[0].message.content
             
-            # Save assistant response
-            self.memory.save_message(
-                role="assistant",
-                content=assistant_message,
-                conversation_id=self.conversation_id
-            )
+            # Save both sides of the turn in one transaction and one embedding call
+            self.memory.save_messages([
+                Message("user", user_message, self.conversation_id),
+                Message("assistant", assistant_message, self.conversation_id)
+            ])
             
             return assistant_message
             
@@ -5,6 +5,7 @@ Handles environment variables and application configuration.
 """
 
 import os
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
@@ -13,16 +14,25 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, init=False)
 class Config:
     """
     Configuration management for Mini Memori.
     
-    Loads configuration from environment variables and .env file.
+    An immutable snapshot of the environment variables and .env file, read
+    once on construction, so it can be shared between threads without a lock.
     """
     
+    openai_api_key: Optional[str] = None
+    db_path: str = "memories.db"
+    embedding_model: str = "text-embedding-3-small"
+    chat_model: str = "gpt-4o-mini"
+    dedup_threshold: Optional[float] = None
+    log_level: str = "INFO"
+    
     def __init__(self, env_file: Optional[str] = None):
         """
-        Initialize configuration.
+        Load configuration from the environment.
         
         Args:
             env_file: Path to .env file (optional)
@@ -34,35 +44,36 @@ class Config:
             # Try to find .env in current directory or parent directories
             load_dotenv()
             
-        logger.info("Configuration loaded")
-        
-    @property
-    def openai_api_key(self) -> Optional[str]:
-        """Get OpenAI API key from environment."""
         key = os.getenv("OPENAI_API_KEY")
         if not key:
             logger.warning("OPENAI_API_KEY not found in environment")
-        return key
+        dedup_threshold = os.getenv("DEDUP_THRESHOLD")
         
-    @property
-    def db_path(self) -> str:
-        """Get database path from environment or use default."""
-        return os.getenv("DB_PATH", "memories.db")
-        
-    @property
-    def embedding_model(self) -> str:
-        """Get embedding model from environment or use default."""
-        return os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        values = {
+            'openai_api_key': key,
+            'db_path': os.getenv("DB_PATH", Config.db_path),
+            'embedding_model': os.getenv("EMBEDDING_MODEL", Config.embedding_model),
+            'chat_model': os.getenv("CHAT_MODEL", Config.chat_model),
+            'dedup_threshold': float(dedup_threshold) if dedup_threshold else None,
+            'log_level': os.getenv("LOG_LEVEL", Config.log_level)
+        }
+        for name, value in values.items():
+            # Frozen fields can only be set through object.__setattr__
+            object.__setattr__(self, name, value)
+        logger.info("Configuration loaded")
         
-    @property
-    def chat_model(self) -> str:
-        """Get chat model from environment or use default."""
-        return os.getenv("CHAT_MODEL", "gpt-4o-mini")
+    @classmethod
+    def from_env(cls, env_file: Optional[str] = None) -> "Config":
+        """
+        Load configuration from the environment (same as Config(env_file)).
         
-    @property
-    def log_level(self) -> str:
-        """Get log level from environment or use default."""
-        return os.getenv("LOG_LEVEL", "INFO")
+        Args:
+            env_file: Path to .env file (optional)
+            
+        Returns:
+            Config instance
+        """
+        return cls(env_file)
         
     def validate(self) -> bool:
         """
@@ -103,7 +114,7 @@ def get_config(env_file: Optional[str] = None) -> Config:
     """
     global _config
     if _config is None:
-        _config = Config(env_file)
+        _config = Config.from_env(env_file)
     return _config
 
 
@@ -7,12 +7,122 @@ message storage, and retrieval operations.
 
 import sqlite3
 import json
-from typing import List, Optional, Dict, Any, Tuple
+import queue
+import re
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple, Sequence, Union
 from datetime import datetime
+import numpy as np
 import logging
+from .ann import HNSWIndex, hnswlib
+from .kernels import quantize_int8
+
+try:
+    import sqlite_vec
+except ImportError:
+    sqlite_vec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# An embedding as callers pass it: a list of floats or a float array
+Vector = Union[Sequence[float], np.ndarray]
+
+
+def encode_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Serialize message metadata to JSON text.
+    
+    Uses orjson when it is installed, otherwise the standard library.
+    
+    Args:
+        metadata: Metadata dictionary (empty or None is stored as NULL)
+        
+    Returns:
+        JSON string or None
+    """
+    if not metadata:
+        return None
+    if orjson is not None:
+        return orjson.dumps(metadata, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(metadata)
+
+
+def decode_metadata(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse message metadata stored by encode_metadata.
+    
+    Args:
+        text: JSON string or None
+        
+    Returns:
+        Metadata dictionary or None
+    """
+    if not text:
+        return None
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def encode_embedding(embedding: Vector) -> bytes:
+    """
+    Pack an embedding vector into a raw little-endian float32 BLOB.
+    
+    Args:
+        embedding: Embedding vector
+        
+    Returns:
+        Packed bytes (4 bytes per dimension)
+    """
+    return np.ascontiguousarray(embedding, dtype='<f4').tobytes()
+
+
+def quantize_embedding(embedding: Vector) -> bytes:
+    """
+    Pack an embedding as int8 codes with a per-vector scale.
+    
+    Layout is a little-endian float32 scale followed by one int8 per
+    dimension (4 + d bytes instead of 4 * d).
+    
+    Args:
+        embedding: Embedding vector
+        
+    Returns:
+        Packed bytes
+    """
+    codes, scale = quantize_int8(np.asarray(embedding, dtype=np.float32))
+    return np.array([scale], dtype='<f4').tobytes() + codes.tobytes()
+
+
+def decode_embedding(blob: bytes, quantized: bool = False) -> np.ndarray:
+    """
+    Unpack an embedding BLOB into a float32 vector.
+    
+    Also reads the JSON-encoded BLOBs written by earlier versions.
+    
+    Args:
+        blob: Stored embedding bytes
+        quantized: Whether the blob was packed by quantize_embedding
+        
+    Returns:
+        Embedding vector as a float32 array
+    """
+    if quantized:
+        scale = np.frombuffer(blob[:4], dtype='<f4')[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+        
+    if blob[:1] == b'[' and blob[-1:] == b']':
+        try:
+            return np.asarray(json.loads(blob.decode('utf-8')), dtype=np.float32)
+        except (UnicodeDecodeError, ValueError):
+            pass  # Raw float32 bytes that happen to look like a JSON array
+    return np.frombuffer(blob, dtype='<f4')
+
 
 class Database:
     """
@@ -25,93 +135,532 @@ class Database:
     - Conversation management
     """
     
-    def __init__(self, db_path: str = "memories.db"):
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+    
+    # Stored in PRAGMA user_version once the schema is created or migrated;
+    # bump it whenever _create_tables changes
+    SCHEMA_VERSION = 1
+    
+    # Bound parameters per statement (SQLite's default limit before 3.32 is 999)
+    MAX_PARAMS = 900
+    
+    # Prepared statements kept per connection (sqlite3 defaults to 128)
+    CACHED_STATEMENTS = 256
+    
+    # Hot-path statements. The statement cache is keyed by SQL text, so the
+    # single-row and batch writers share one string and one prepared statement
+    _INSERT_MESSAGE_SQL = (
+        "INSERT INTO messages (conversation_id, role, content, metadata) VALUES (?, ?, ?, ?)"
+    )
+    _INSERT_EMBEDDING_SQL = (
+        "INSERT INTO embeddings (message_id, embedding, model, quantized, dim) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    
+    # Columns the embedding scans decode into (embedding, message) rows
+    _EMBEDDING_COLUMNS = (
+        "SELECT m.id, m.conversation_id, m.role, m.content, m.timestamp, m.metadata, "
+        "e.embedding, e.model, e.quantized"
+    )
+    
+    def __init__(
+        self,
+        db_path: str = "memories.db",
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        quantize: bool = False,
+        read_connections: int = 0
+    ):
         """
         Initialize the database connection.
         
         Args:
             db_path: Path to the SQLite database file
+            journal_mode: SQLite journal mode (WAL by default)
+            synchronous: SQLite synchronous level (NORMAL by default, which
+                only fsyncs at WAL checkpoints)
+            quantize: Store new embeddings as int8 with a per-vector scale
+                (4x smaller) instead of float32
+            read_connections: Size of a pool of read-only connections used
+                for retrieval, so reads from several threads run concurrently
+                with the writer (WAL file databases only; 0 disables the pool)
         """
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in self.JOURNAL_MODES:
+            raise ValueError(f"Invalid journal_mode: {journal_mode}")
+        if synchronous not in self.SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid synchronous: {synchronous}")
+            
         self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.quantize = quantize
         self.conn = None
+        self.vec_enabled = False
+        self.fts_enabled = False
+        self._vec_dim = None
+        self.ann: Optional[HNSWIndex] = None
+        self._batch_depth = 0
+        self._readers: Optional[queue.Queue] = None
         self._connect()
         self._create_schema()
+        self._open_readers(read_connections)
         
     def _connect(self) -> None:
         """Establish database connection with optimized settings."""
         try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-            # Enable WAL mode for better concurrency
-            self.conn.execute("PRAGMA journal_mode=WAL")
+            # One long-lived writer; its statement cache reuses the prepared
+            # form of every fixed SQL string below across calls
+            self.conn = self._open_connection()
+            # WAL turns each commit into an append instead of two fsyncs
+            self.conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            self._load_vec_extension()
             logger.info(f"Connected to database: {self.db_path}")
         except sqlite3.Error as e:
             logger.error(f"Database connection error: {e}")
             raise
             
+    @property
+    def read_pool_enabled(self) -> bool:
+        """Whether reads can be served by the pool of read-only connections."""
+        return self._readers is not None
+        
+    @property
+    def in_transaction(self) -> bool:
+        """Whether the writer has uncommitted changes (e.g. inside batch())."""
+        return self.conn.in_transaction
+        
+    @property
+    def knn_enabled(self) -> bool:
+        """Whether search_embeddings is served by an index (sqlite-vec or HNSW)."""
+        return self.ann is not None or self._vec_dim is not None
+        
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a connection to the database file with the shared tuning pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+        
+    def _open_readers(self, count: int) -> None:
+        """Fill the pool of read-only connections used by _reader()."""
+        if count <= 0:
+            return
+        if self.db_path == ":memory:" or self.journal_mode != "WAL":
+            # Other connections can't see a private in-memory database, and
+            # outside WAL readers would block on every write anyway
+            logger.warning("Read connection pool needs a WAL file database, not enabling it")
+            return
+            
+        self._readers = queue.Queue()
+        for _ in range(count):
+            conn = self._open_connection()
+            if self.vec_enabled:
+                conn.enable_load_extension(True)
+                sqlite_vec.load(conn)
+                conn.enable_load_extension(False)
+            conn.execute("PRAGMA query_only=1")
+            self._readers.put(conn)
+        logger.debug(f"Opened {count} read connections")
+        
+    @contextmanager
+    def _reader(self, committed: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a read-only connection from the pool for the duration of a block.
+        
+        Each reader sees the last committed WAL snapshot, so it falls back to
+        the writer when there is no pool or a write transaction is open (to
+        read this database's own uncommitted writes). With committed, an open
+        transaction doesn't make it fall back, so a pooled read from another
+        thread never touches the writer.
+        """
+        if self._readers is None or (self.conn.in_transaction and not committed):
+            yield self.conn
+            return
+            
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+            
+    def _load_vec_extension(self) -> None:
+        """Load the sqlite-vec extension for in-database KNN search, if installed."""
+        if sqlite_vec is None:
+            return
+            
+        try:
+            self.conn.enable_load_extension(True)
+            sqlite_vec.load(self.conn)
+            self.conn.enable_load_extension(False)
+            self.vec_enabled = True
+            logger.debug("Loaded sqlite-vec extension")
+        except (AttributeError, sqlite3.Error) as e:
+            # Some Python builds are compiled without extension loading
+            logger.warning(f"sqlite-vec unavailable, falling back to linear scan: {e}")
+            
     def _create_schema(self) -> None:
         """Create database schema if it doesn't exist."""
         try:
             cursor = self.conn.cursor()
             
-            # Messages table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # Tables, indexes, triggers and migrations only change with
+            # SCHEMA_VERSION, so a database already at it skips all of that DDL
+            if cursor.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                self._create_tables(cursor)
+                cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            elif cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'"
+            ).fetchone():
+                self.fts_enabled = True
+            else:
+                # Written by a SQLite without FTS5; try again with this one
+                self._create_fts_index(cursor)
+                
+            if self.vec_enabled:
+                self._create_vec_index(cursor)
+            elif hnswlib is not None:
+                self._create_ann_index(cursor)
+                
+            self.conn.commit()
+            logger.info("Database schema created successfully")
             
-            # Embeddings table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS embeddings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    message_id INTEGER NOT NULL,
-                    embedding BLOB NOT NULL,
-                    model TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE
-                )
-            """)
+        except sqlite3.Error as e:
+            logger.error(f"Schema creation error: {e}")
+            raise
             
-            # Conversations table for metadata
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT
-                )
-            """)
+    def _create_tables(self, cursor: sqlite3.Cursor) -> None:
+        """Create the tables, indexes and triggers, migrating older layouts."""
+        # Messages table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                metadata TEXT
+            )
+        """)
+        
+        self._migrate_messages(cursor)
+        
+        # Embeddings table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                model TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                quantized INTEGER NOT NULL DEFAULT 0,
+                dim INTEGER,
+                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE
+            )
+        """)
+        
+        self._migrate_embeddings(cursor)
+        
+        # Conversations table for metadata
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                metadata TEXT
+            )
+        """)
+        
+        # Keep each message's conversation row present and its updated_at
+        # current, in the same statement as the message insert
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_touch_conversation
+            AFTER INSERT ON messages BEGIN
+                INSERT INTO conversations (id, updated_at)
+                VALUES (new.conversation_id, CURRENT_TIMESTAMP)
+                ON CONFLICT (id) DO UPDATE SET updated_at = CURRENT_TIMESTAMP;
+            END
+        """)
+        
+        # Embeddings keyed by content hash, so repeated text skips the API
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                hash BLOB NOT NULL,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (hash, model)
+            ) WITHOUT ROWID
+        """)
+        
+        # Create indexes for better performance. Index entries end with the
+        # rowid, so this one also keeps each conversation in id order
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation
+            ON messages(conversation_id)
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_embeddings_message
+            ON embeddings(message_id)
+        """)
+        
+        self._create_fts_index(cursor)
+        
+    def _migrate_messages(self, cursor: sqlite3.Cursor) -> None:
+        """Drop message columns and indexes that earlier versions kept."""
+        # Messages are ordered by id, which is monotonic, so neither a second
+        # creation time nor a timestamp index is needed
+        cursor.execute("DROP INDEX IF EXISTS idx_messages_timestamp")
+        
+        columns = [
+            row['name'] for row in cursor.execute("PRAGMA index_info(idx_messages_conversation)")
+        ]
+        if columns != ['conversation_id']:
+            cursor.execute("DROP INDEX IF EXISTS idx_messages_conversation")
             
-            # Create indexes for better performance
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_conversation 
-                ON messages(conversation_id, timestamp)
-            """)
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(messages)")}
+        if 'created_at' in columns:
+            try:
+                cursor.execute("ALTER TABLE messages DROP COLUMN created_at")
+            except sqlite3.OperationalError as e:
+                # DROP COLUMN needs SQLite 3.35; the column is harmless otherwise
+                logger.debug(f"Keeping messages.created_at: {e}")
+                
+    def _migrate_embeddings(self, cursor: sqlite3.Cursor) -> None:
+        """Bring embeddings written by earlier versions up to the current format."""
+        # Format and dimension columns were added after the first release
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(embeddings)")}
+        if 'quantized' not in columns:
+            cursor.execute("ALTER TABLE embeddings ADD COLUMN quantized INTEGER NOT NULL DEFAULT 0")
+        if 'dim' not in columns:
+            cursor.execute("ALTER TABLE embeddings ADD COLUMN dim INTEGER")
+            
+        # Re-pack JSON-encoded vectors as float32
+        cursor.execute("""
+            SELECT id, embedding FROM embeddings
+            WHERE dim IS NULL AND quantized = 0
+            AND substr(embedding, 1, 1) = X'5B' AND substr(embedding, -1, 1) = X'5D'
+        """)
+        repacked = []
+        for row in cursor.fetchall():
+            packed = encode_embedding(decode_embedding(row['embedding']))
+            if packed != row['embedding']:
+                repacked.append((packed, row['id']))
+        if repacked:
+            cursor.executemany("UPDATE embeddings SET embedding = ? WHERE id = ?", repacked)
+            logger.info(f"Converted {len(repacked)} JSON embeddings to float32")
             
+        cursor.execute("""
+            UPDATE embeddings
+            SET dim = CASE WHEN quantized THEN length(embedding) - 4 ELSE length(embedding) / 4 END
+            WHERE dim IS NULL
+        """)
+        
+    def _create_fts_index(self, cursor: sqlite3.Cursor) -> None:
+        """Create the FTS5 keyword index and its sync triggers, if FTS5 is available."""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'"
+        ).fetchone()
+        
+        if not exists:
+            try:
+                # Trigram tokens keep substring matching, like the old LIKE scan
+                cursor.execute("""
+                    CREATE VIRTUAL TABLE messages_fts USING fts5(
+                        content,
+                        content='messages',
+                        content_rowid='id',
+                        tokenize='trigram'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"FTS5 unavailable, keyword search will scan messages: {e}")
+                return
+                
+            # Index messages written before the table existed
+            cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content)
+                VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        self.fts_enabled = True
+        
+    def _create_vec_index(self, cursor: sqlite3.Cursor) -> None:
+        """Attach to the vec0 KNN table, backfilling any embeddings it is missing."""
+        row = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='vec_messages'"
+        ).fetchone()
+        
+        if row:
+            self._vec_dim = int(re.search(r'float\[(\d+)\]', row['sql'], re.IGNORECASE).group(1))
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_embeddings_message 
-                ON embeddings(message_id)
+                SELECT message_id, embedding, quantized FROM embeddings
+                WHERE message_id NOT IN (SELECT rowid FROM vec_messages)
+                ORDER BY id
             """)
+        else:
+            cursor.execute("SELECT message_id, embedding, quantized FROM embeddings ORDER BY id")
             
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
-                ON messages(timestamp)
+        # Existing embeddings (JSON-encoded or int8) need re-packing before indexing
+        rows = [
+            (
+                row['message_id'],
+                encode_embedding(decode_embedding(row['embedding'], row['quantized']))
+            )
+            for row in cursor.fetchall()
+        ]
+        if rows:
+            self._index_vectors(cursor, rows)
+            logger.info(f"Indexed {len(rows)} embeddings with sqlite-vec")
+            
+    def _create_ann_index(self, cursor: sqlite3.Cursor) -> None:
+        """Open the HNSW sidecar index, bringing it in line with the embeddings table."""
+        # In-memory databases get an in-memory index
+        self.ann = HNSWIndex(None if self.db_path == ":memory:" else self.db_path + ".hnsw")
+        
+        row = cursor.execute("SELECT dim FROM embeddings ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return
+            
+        dim = row['dim']
+        indexed = self.ann.load(dim)
+        stored = {
+            row['message_id']
+            for row in cursor.execute("""
+                SELECT e.message_id FROM embeddings e
+                JOIN messages m ON m.id = e.message_id
+                WHERE e.dim = ?
+            """, (dim,))
+        }
+        
+        # The saved file lags the database by any writes since its last save
+        self.ann.remove(indexed - stored)
+        missing = sorted(stored - indexed)
+        for start in range(0, len(missing), self.MAX_PARAMS):
+            chunk = missing[start:start + self.MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = cursor.execute(f"""
+                SELECT message_id, embedding, quantized FROM embeddings
+                WHERE message_id IN ({placeholders}) AND dim = ?
+            """, [*chunk, dim]).fetchall()
+            self.ann.add(
+                [row['message_id'] for row in rows],
+                np.stack([decode_embedding(row['embedding'], row['quantized']) for row in rows])
+            )
+        if missing:
+            logger.info(f"Indexed {len(missing)} embeddings with hnswlib")
+            
+    def _index_vectors(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, bytes]]) -> None:
+        """
+        Add packed embeddings to the KNN index (vec0 table or HNSW sidecar).
+        
+        The index is created on first use, sized to the first vector seen;
+        vectors of any other dimension are left to the linear scan.
+        
+        Args:
+            cursor: Cursor of the current transaction
+            rows: List of (message_id, packed_embedding) tuples
+        """
+        if not rows:
+            return
+            
+        if self.ann is not None:
+            dim = self.ann.dim or len(rows[0][1]) // 4
+            rows = [(message_id, blob) for message_id, blob in rows if len(blob) == dim * 4]
+            self.ann.add(
+                [message_id for message_id, _ in rows],
+                np.frombuffer(b"".join(blob for _, blob in rows), dtype='<f4').reshape(-1, dim)
+            )
+            return
+            
+        if not self.vec_enabled:
+            return
+            
+        if self._vec_dim is None:
+            self._vec_dim = len(rows[0][1]) // 4
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS vec_messages USING vec0(
+                    conversation_id TEXT PARTITION KEY,
+                    embedding FLOAT[{self._vec_dim}] distance_metric=cosine
+                )
             """)
             
+        rows = [(message_id, blob) for message_id, blob in rows if len(blob) == self._vec_dim * 4]
+        
+        # vec0 has no upsert, so clear any previous vector for the message first
+        cursor.executemany(
+            "DELETE FROM vec_messages WHERE rowid = ?",
+            [(message_id,) for message_id, _ in rows]
+        )
+        cursor.executemany("""
+            INSERT INTO vec_messages (rowid, conversation_id, embedding)
+            SELECT id, conversation_id, ? FROM messages WHERE id = ?
+        """, [(blob, message_id) for message_id, blob in rows])
+        
+    @contextmanager
+    def batch(self) -> Iterator["Database"]:
+        """
+        Group writes into a single transaction, committed when the block exits.
+        
+        Writes inside the block skip their own commits, so a chat turn costs
+        one fsync instead of one per statement. Blocks may nest; the
+        outermost one commits, or rolls back if an exception escapes it.
+        
+        Yields:
+            This database
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.rollback()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush()
+            
+    def flush(self) -> None:
+        """Commit any open transaction."""
+        if self.conn.in_transaction:
             self.conn.commit()
-            logger.info("Database schema created successfully")
             
-        except sqlite3.Error as e:
-            logger.error(f"Schema creation error: {e}")
-            raise
+    def _begin(self, cursor: sqlite3.Cursor) -> None:
+        """Take the write lock up front, unless a transaction is already open."""
+        if not self.conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+            
+    def _commit(self) -> None:
+        """Commit, unless the write is part of a batch."""
+        if self._batch_depth == 0:
+            self.conn.commit()
             
     def save_message(
         self,
@@ -134,42 +683,128 @@ class Database:
         """
         try:
             cursor = self.conn.cursor()
+            self._begin(cursor)
             
-            # Ensure conversation exists
-            cursor.execute("""
-                INSERT OR IGNORE INTO conversations (id, updated_at) 
-                VALUES (?, CURRENT_TIMESTAMP)
-            """, (conversation_id,))
+            # Insert message (a trigger creates or touches its conversation)
+            metadata_json = encode_metadata(metadata)
+            cursor.execute(
+                self._INSERT_MESSAGE_SQL, (conversation_id, role, content, metadata_json)
+            )
+            
+            message_id = cursor.lastrowid
+            self._commit()
             
-            # Update conversation timestamp
+            logger.debug("Saved message %d to conversation %s", message_id, conversation_id)
+            return message_id
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error saving message: {e}")
+            self.conn.rollback()
+            raise
+            
+    def refresh_message(
+        self,
+        message_id: int,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        Overwrite a message's content in place.
+        
+        Used to fold a near-duplicate into an existing message instead of
+        inserting a new row. The stored embedding is kept, and so are the ID
+        and timestamp, so the message keeps its place in history order.
+        
+        Args:
+            message_id: Message ID
+            content: New message content
+            metadata: New metadata (None keeps the existing metadata)
+            
+        Returns:
+            True if the message exists
+        """
+        try:
+            cursor = self.conn.cursor()
+            self._begin(cursor)
             cursor.execute("""
-                UPDATE conversations 
-                SET updated_at = CURRENT_TIMESTAMP 
+                UPDATE messages
+                SET content = ?,
+                    metadata = COALESCE(?, metadata)
                 WHERE id = ?
-            """, (conversation_id,))
+            """, (content, encode_metadata(metadata), message_id))
+            updated = cursor.rowcount > 0
+            if updated:
+                cursor.execute("""
+                    UPDATE conversations SET updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (SELECT conversation_id FROM messages WHERE id = ?)
+                """, (message_id,))
+            self._commit()
             
-            # Insert message
-            metadata_json = json.dumps(metadata) if metadata else None
-            cursor.execute("""
-                INSERT INTO messages (conversation_id, role, content, metadata)
-                VALUES (?, ?, ?, ?)
-            """, (conversation_id, role, content, metadata_json))
+            logger.debug("Refreshed message %d", message_id)
+            return updated
             
-            message_id = cursor.lastrowid
-            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error refreshing message: {e}")
+            self.conn.rollback()
+            raise
             
-            logger.debug(f"Saved message {message_id} to conversation {conversation_id}")
-            return message_id
+    def save_messages(
+        self,
+        messages: List[Tuple[str, str, str, Optional[Dict[str, Any]]]],
+        embeddings: Optional[Union[Sequence[Optional[Vector]], np.ndarray]] = None,
+        model: Optional[str] = None
+    ) -> List[int]:
+        """
+        Save several messages (and optionally their embeddings) in one transaction.
+        
+        Args:
+            messages: List of (conversation_id, role, content, metadata) tuples
+            embeddings: Optional embedding vectors (or an (N, d) array) aligned
+                with messages; None entries are skipped
+            model: Name of the embedding model used for the embeddings
+            
+        Returns:
+            List of message IDs, in the same order as messages
+        """
+        if not messages:
+            return []
+            
+        try:
+            cursor = self.conn.cursor()
+            self._begin(cursor)
+            
+            # Insert messages (a trigger creates or touches their conversations)
+            cursor.executemany(self._INSERT_MESSAGE_SQL, [
+                (conv_id, role, content, encode_metadata(metadata))
+                for conv_id, role, content, metadata in messages
+            ])
+            
+            # AUTOINCREMENT ids are consecutive within a single write transaction
+            last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            message_ids = list(range(last_id - len(messages) + 1, last_id + 1))
+            
+            # Insert embeddings
+            if embeddings is not None:
+                self._insert_embeddings(cursor, [
+                    (message_id, embedding)
+                    for message_id, embedding in zip(message_ids, embeddings)
+                    if embedding is not None
+                ], model)
+                
+            self._commit()
+            
+            logger.debug("Saved %d messages in one transaction", len(message_ids))
+            return message_ids
             
         except sqlite3.Error as e:
-            logger.error(f"Error saving message: {e}")
+            logger.error(f"Error saving messages: {e}")
             self.conn.rollback()
             raise
             
     def save_embedding(
         self,
         message_id: int,
-        embedding: List[float],
+        embedding: Vector,
         model: str
     ) -> int:
         """
@@ -177,7 +812,8 @@ class Database:
         
         Args:
             message_id: ID of the associated message
-            embedding: Embedding vector as list of floats
+            embedding: Embedding vector (stored as packed float32, or int8
+                when quantize is enabled)
             model: Name of the embedding model used
             
         Returns:
@@ -186,18 +822,22 @@ class Database:
         try:
             cursor = self.conn.cursor()
             
-            # Convert embedding to bytes for storage
-            embedding_bytes = json.dumps(embedding).encode('utf-8')
+            # Pack embedding as raw float32 bytes for storage
+            embedding_bytes = encode_embedding(embedding)
             
-            cursor.execute("""
-                INSERT INTO embeddings (message_id, embedding, model)
-                VALUES (?, ?, ?)
-            """, (message_id, embedding_bytes, model))
+            cursor.execute(self._INSERT_EMBEDDING_SQL, (
+                message_id,
+                self._stored_embedding(embedding_bytes),
+                model,
+                self.quantize,
+                len(embedding_bytes) // 4
+            ))
             
             embedding_id = cursor.lastrowid
-            self.conn.commit()
+            self._index_vectors(cursor, [(message_id, embedding_bytes)])
+            self._commit()
             
-            logger.debug(f"Saved embedding {embedding_id} for message {message_id}")
+            logger.debug("Saved embedding %d for message %d", embedding_id, message_id)
             return embedding_id
             
         except sqlite3.Error as e:
@@ -205,16 +845,374 @@ class Database:
             self.conn.rollback()
             raise
             
-    def get_all_embeddings(self) -> List[Tuple[int, List[float], Dict[str, Any]]]:
+    def save_embeddings(
+        self,
+        embeddings: Iterable[Tuple[int, Vector]],
+        model: str
+    ) -> int:
         """
-        Retrieve all embeddings with their associated message data.
+        Save embeddings for several existing messages in one transaction.
+        
+        Args:
+            embeddings: (message_id, embedding) pairs
+            model: Name of the embedding model used
+            
+        Returns:
+            Number of embeddings saved
+        """
+        try:
+            cursor = self.conn.cursor()
+            self._begin(cursor)
+            count = self._insert_embeddings(cursor, embeddings, model)
+            self._commit()
+            
+            logger.debug("Saved %d embeddings in one transaction", count)
+            return count
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error saving embeddings: {e}")
+            self.conn.rollback()
+            raise
+            
+    def _insert_embeddings(
+        self,
+        cursor: sqlite3.Cursor,
+        embeddings: Iterable[Tuple[int, Vector]],
+        model: str
+    ) -> int:
+        """Insert (message_id, embedding) pairs with one executemany and index them."""
+        packed = [(message_id, encode_embedding(embedding)) for message_id, embedding in embeddings]
+        cursor.executemany(self._INSERT_EMBEDDING_SQL, [
+            (message_id, self._stored_embedding(blob), model, self.quantize, len(blob) // 4)
+            for message_id, blob in packed
+        ])
+        self._index_vectors(cursor, packed)
+        return len(packed)
+        
+    def _stored_embedding(self, packed: bytes) -> bytes:
+        """Convert a packed float32 embedding to the configured storage format."""
+        if not self.quantize:
+            return packed
+        return quantize_embedding(np.frombuffer(packed, dtype='<f4'))
         
+    def get_cached_embeddings(
+        self,
+        hashes: Sequence[bytes],
+        model: str
+    ) -> Dict[bytes, np.ndarray]:
+        """
+        Look up cached embeddings by content hash.
+        
+        Args:
+            hashes: Content hashes to look up
+            model: Embedding model the vectors were generated with
+            
         Returns:
-            List of tuples: (message_id, embedding_vector, message_dict)
+            Dictionary mapping each cached hash to its embedding
         """
         try:
             cursor = self.conn.cursor()
-            cursor.execute("""
+            hashes = list(dict.fromkeys(hashes))
+            cached: Dict[bytes, np.ndarray] = {}
+            
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(hashes), self.MAX_PARAMS):
+                chunk = hashes[start:start + self.MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"""
+                    SELECT hash, embedding FROM embedding_cache
+                    WHERE model = ? AND hash IN ({placeholders})
+                """, [model, *chunk])
+                cached.update(
+                    (row['hash'], decode_embedding(row['embedding']))
+                    for row in cursor.fetchall()
+                )
+                
+            logger.debug(f"Embedding cache: {len(cached)}/{len(hashes)} hits")
+            return cached
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error reading embedding cache: {e}")
+            raise
+            
+    def cache_embeddings(
+        self,
+        entries: Sequence[Tuple[bytes, Vector]],
+        model: str
+    ) -> None:
+        """
+        Store embeddings in the content-hash cache.
+        
+        Args:
+            entries: List of (content_hash, embedding) tuples
+            model: Embedding model the vectors were generated with
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO embedding_cache (hash, model, embedding)
+                VALUES (?, ?, ?)
+            """, [
+                (content_hash, model, encode_embedding(embedding))
+                for content_hash, embedding in entries
+            ])
+            self._commit()
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error writing embedding cache: {e}")
+            self.conn.rollback()
+            raise
+            
+    def load_embedding_matrix(
+        self,
+        dimension: int,
+        conversation_id: Optional[str] = None,
+        committed: bool = False
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """
+        Load stored embeddings of one dimension into a single matrix.
+        
+        Rows are streamed from the cursor straight into a preallocated float32
+        array, so no list of row BLOBs is built, then scaled to unit length in
+        place so scoring is a single matrix-vector product. Embeddings of other
+        dimensions (from a different model) are filtered out in SQL.
+        
+        Args:
+            dimension: Embedding dimension to load
+            conversation_id: Optional filter by conversation
+            committed: Read only committed rows through the read pool, even
+                while a write transaction is open (for loads from another
+                thread; see read_pool_enabled)
+            
+        Returns:
+            Tuple of ((N, dimension) unit-norm float32 matrix, message dicts
+            aligned with its rows)
+        """
+        try:
+            matrix, messages = self._embedding_rows(
+                dimension,
+                conversation_id,
+                np.float32,
+                lambda row: decode_embedding(row['embedding'], row['quantized']),
+                committed
+            )
+            
+            # int8 and legacy rows aren't exactly unit length
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms != 0)
+            
+            logger.debug(f"Loaded {len(messages)} embeddings into a matrix")
+            return matrix, messages
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error loading embedding matrix: {e}")
+            raise
+            
+    def load_embedding_codes(
+        self,
+        dimension: int,
+        conversation_id: Optional[str] = None,
+        committed: bool = False
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """
+        Load stored embeddings of one dimension as an int8 matrix.
+        
+        Quantized rows are copied as stored, without their scale (cosine
+        scoring doesn't need it); float32 rows are quantized on load. The
+        matrix takes a quarter of the memory of load_embedding_matrix.
+        
+        Args:
+            dimension: Embedding dimension to load
+            conversation_id: Optional filter by conversation
+            committed: Read only committed rows through the read pool (see
+                load_embedding_matrix)
+            
+        Returns:
+            Tuple of ((N, dimension) int8 matrix, message dicts aligned with
+            its rows)
+        """
+        try:
+            def decode(row: sqlite3.Row) -> np.ndarray:
+                if row['quantized']:
+                    return np.frombuffer(row['embedding'], dtype=np.int8, offset=4)
+                return quantize_int8(decode_embedding(row['embedding']))[0]
+                
+            codes, messages = self._embedding_rows(
+                dimension, conversation_id, np.int8, decode, committed
+            )
+            
+            logger.debug(f"Loaded {len(messages)} embeddings into an int8 matrix")
+            return codes, messages
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error loading embedding codes: {e}")
+            raise
+            
+    def _embedding_rows(
+        self,
+        dimension: int,
+        conversation_id: Optional[str],
+        dtype: type,
+        decode: Callable[[sqlite3.Row], np.ndarray],
+        committed: bool = False
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """
+        Decode messages' embeddings of one dimension into a matrix, newest first.
+        
+        The matrix is sized by a COUNT query and filled row by row as the
+        cursor steps, so only one row's BLOB is alive at a time.
+        """
+        source, params = self._embedding_source(dimension, conversation_id)
+        
+        with self._reader(committed) as conn:
+            count = conn.execute("SELECT COUNT(*)" + source, params).fetchone()[0]
+            matrix = np.empty((count, dimension), dtype=dtype)
+            messages: List[Dict[str, Any]] = []
+            
+            cursor = conn.cursor().execute(
+                self._EMBEDDING_COLUMNS + source + " ORDER BY m.id DESC", params
+            )
+            for row in cursor:
+                if len(messages) == len(matrix):
+                    # Rows committed between the count and the scan
+                    spare: np.ndarray = np.empty((len(matrix) + 1, dimension), dtype=dtype)
+                    matrix = np.concatenate([matrix, spare])
+                matrix[len(messages)] = decode(row)
+                messages.append(self._embedded_message(row))
+                
+        return matrix[:len(messages)], messages
+        
+    def _embedding_source(
+        self,
+        dimension: int,
+        conversation_id: Optional[str]
+    ) -> Tuple[str, List[Any]]:
+        """Build the FROM/WHERE clause selecting messages' embeddings of one dimension."""
+        source = " FROM messages m JOIN embeddings e ON m.id = e.message_id WHERE e.dim = ?"
+        params: List[Any] = [dimension]
+        if conversation_id is not None:
+            source += " AND m.conversation_id = ?"
+            params.append(conversation_id)
+        return source, params
+        
+    def iter_embedding_batches(
+        self,
+        dimension: int,
+        conversation_id: Optional[str] = None,
+        batch_size: int = 4096
+    ) -> Iterator[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """
+        Stream stored embeddings of one dimension as matrix batches, newest first.
+        
+        Unlike load_embedding_matrix, at most batch_size rows are decoded at a
+        time, so memory use doesn't grow with the number of stored embeddings.
+        
+        Args:
+            dimension: Embedding dimension to load
+            conversation_id: Optional filter by conversation
+            batch_size: Maximum rows per batch
+            
+        Yields:
+            Tuples of ((n, dimension) unit-norm float32 matrix, message dicts
+            aligned with its rows)
+        """
+        try:
+            source, params = self._embedding_source(dimension, conversation_id)
+            
+            with self._reader() as conn:
+                cursor = conn.cursor().execute(
+                    self._EMBEDDING_COLUMNS + source + " ORDER BY m.id DESC", params
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                        
+                    matrix = np.empty((len(rows), dimension), dtype=np.float32)
+                    for i, row in enumerate(rows):
+                        matrix[i] = decode_embedding(row['embedding'], row['quantized'])
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    np.divide(matrix, norms, out=matrix, where=norms != 0)
+                    
+                    yield matrix, [self._embedded_message(row) for row in rows]
+                    
+        except sqlite3.Error as e:
+            logger.error(f"Error streaming embeddings: {e}")
+            raise
+            
+    def get_message_embeddings(
+        self,
+        message_ids: Sequence[int],
+        dimension: int
+    ) -> Dict[int, np.ndarray]:
+        """
+        Retrieve the latest embedding of one dimension for each of some messages.
+        
+        Args:
+            message_ids: Message IDs to look up
+            dimension: Embedding dimension to load
+            
+        Returns:
+            Dictionary mapping message ID to float32 embedding, for the
+            messages that have one
+        """
+        if not message_ids:
+            return {}
+            
+        try:
+            placeholders = ",".join("?" * len(message_ids))
+            with self._reader() as conn:
+                rows = conn.cursor().execute(f"""
+                    SELECT message_id, embedding, quantized FROM embeddings
+                    WHERE message_id IN ({placeholders}) AND dim = ?
+                    ORDER BY id
+                """, [*message_ids, dimension]).fetchall()
+                
+            # Later rows overwrite earlier ones, leaving each message's latest
+            return {
+                row['message_id']: decode_embedding(row['embedding'], row['quantized'])
+                for row in rows
+            }
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error retrieving message embeddings: {e}")
+            raise
+            
+    def get_all_embeddings(
+        self,
+        conversation_id: Optional[str] = None
+    ) -> List[Tuple[int, np.ndarray, Dict[str, Any]]]:
+        """
+        Retrieve all embeddings with their associated message data.
+        
+        Args:
+            conversation_id: Optional filter by conversation, applied in SQL
+            
+        Returns:
+            List of tuples: (message_id, float32 embedding array, message_dict)
+        """
+        results = list(self.iter_embeddings(conversation_id))
+        logger.debug(f"Retrieved {len(results)} embeddings")
+        return results
+        
+    def iter_embeddings(
+        self,
+        conversation_id: Optional[str] = None
+    ) -> Iterator[Tuple[int, np.ndarray, Dict[str, Any]]]:
+        """
+        Stream embeddings with their associated message data, newest first.
+        
+        Rows are decoded as the caller consumes them, so memory use doesn't
+        grow with the number of stored embeddings.
+        
+        Args:
+            conversation_id: Optional filter by conversation
+            
+        Yields:
+            Tuples of (message_id, float32 embedding array, message_dict)
+        """
+        try:
+            sql = """
                 SELECT 
                     m.id,
                     m.conversation_id,
@@ -223,51 +1221,319 @@ class Database:
                     m.timestamp,
                     m.metadata,
                     e.embedding,
-                    e.model
+                    e.model,
+                    e.quantized
                 FROM messages m
                 JOIN embeddings e ON m.id = e.message_id
-                ORDER BY m.timestamp DESC
-            """)
+            """
+            params = []
+            if conversation_id is not None:
+                sql += " WHERE m.conversation_id = ?"
+                params.append(conversation_id)
+            sql += " ORDER BY m.id DESC"
             
-            results = []
-            for row in cursor.fetchall():
-                embedding = json.loads(row['embedding'].decode('utf-8'))
-                message_dict = {
-                    'id': row['id'],
-                    'conversation_id': row['conversation_id'],
-                    'role': row['role'],
-                    'content': row['content'],
-                    'timestamp': row['timestamp'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else None,
-                    'embedding_model': row['model']
-                }
-                results.append((row['id'], embedding, message_dict))
+            # A cursor of its own, so other queries don't reset it mid-iteration
+            with self._reader() as conn:
+                for row in conn.cursor().execute(sql, params):
+                    embedding = decode_embedding(row['embedding'], row['quantized'])
+                    yield row['id'], embedding, self._embedded_message(row)
                 
-            logger.debug(f"Retrieved {len(results)} embeddings")
+        except sqlite3.Error as e:
+            logger.error(f"Error retrieving embeddings: {e}")
+            raise
+            
+    def search_embeddings(
+        self,
+        query_embedding: Vector,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None
+    ) -> Optional[List[Tuple[int, float, Dict[str, Any]]]]:
+        """
+        Find the nearest embeddings with the sqlite-vec or HNSW KNN index.
+        
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            conversation_id: Optional filter by conversation
+            
+        Returns:
+            List of (message_id, similarity_score, message_dict) tuples sorted
+            by similarity, or None if the KNN index can't serve the query
+        """
+        if self.ann is not None:
+            return self._search_ann(query_embedding, top_k, conversation_id)
+            
+        query_bytes = encode_embedding(query_embedding)
+        if self._vec_dim is None or len(query_bytes) != self._vec_dim * 4:
+            return None
+            
+        try:
+            # KNN and message lookup in one statement; only the k hits are
+            # ever materialized
+            knn = "SELECT rowid, distance FROM vec_messages WHERE embedding MATCH ? AND k = ?"
+            params = [query_bytes, top_k]
+            if conversation_id is not None:
+                knn += " AND conversation_id = ?"
+                params.append(conversation_id)
+            sql = f"""
+                WITH knn AS ({knn})
+                SELECT
+                    m.id,
+                    m.conversation_id,
+                    m.role,
+                    m.content,
+                    m.timestamp,
+                    m.metadata,
+                    (SELECT model FROM embeddings WHERE message_id = m.id
+                     ORDER BY id DESC LIMIT 1) AS model,
+                    knn.distance
+                FROM knn
+                JOIN messages m ON m.id = knn.rowid
+                ORDER BY knn.distance IS NULL, knn.distance
+            """
+            with self._reader() as conn:
+                rows = conn.cursor().execute(sql, params).fetchall()
+                
+            # Cosine distance is 1 - similarity (None for a zero vector)
+            results = [
+                (
+                    row['id'],
+                    0.0 if row['distance'] is None else max(0.0, min(1.0, 1.0 - row['distance'])),
+                    self._embedded_message(row)
+                )
+                for row in rows
+            ]
+            
+            logger.debug(f"KNN search returned {len(results)} embeddings")
             return results
             
         except sqlite3.Error as e:
-            logger.error(f"Error retrieving embeddings: {e}")
+            logger.error(f"Error searching embeddings: {e}")
             raise
             
+    def _search_ann(
+        self,
+        query_embedding: Vector,
+        top_k: int,
+        conversation_id: Optional[str]
+    ) -> Optional[List[Tuple[int, float, Dict[str, Any]]]]:
+        """Search the HNSW index, restricted to one conversation's messages if given."""
+        if self.ann is None:
+            return None
+            
+        try:
+            allowed = None
+            if conversation_id is not None:
+                with self._reader() as conn:
+                    rows = conn.cursor().execute("""
+                        SELECT e.message_id FROM embeddings e
+                        JOIN messages m ON m.id = e.message_id
+                        WHERE m.conversation_id = ?
+                    """, (conversation_id,)).fetchall()
+                allowed = {row['message_id'] for row in rows}
+                
+            hits = self.ann.search(np.asarray(query_embedding, dtype=np.float32), top_k, allowed)
+            if hits is None:
+                return None
+            results = self._hydrate_hits(hits)
+            
+            logger.debug(f"HNSW search returned {len(results)} embeddings")
+            return results
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error searching embeddings: {e}")
+            raise
+            
+    def _hydrate_hits(
+        self,
+        hits: List[Tuple[int, float]]
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Attach message data to (message_id, similarity) hits with one query."""
+        if not hits:
+            return []
+            
+        placeholders = ",".join("?" * len(hits))
+        sql = f"""
+            SELECT
+                m.id,
+                m.conversation_id,
+                m.role,
+                m.content,
+                m.timestamp,
+                m.metadata,
+                e.model
+            FROM messages m
+            JOIN embeddings e ON m.id = e.message_id
+            WHERE m.id IN ({placeholders})
+        """
+        with self._reader() as conn:
+            rows = conn.cursor().execute(sql, [message_id for message_id, _ in hits]).fetchall()
+        messages = {row['id']: self._embedded_message(row) for row in rows}
+        
+        # Hits whose message is gone (e.g. a rolled-back write) are dropped
+        return [
+            (message_id, similarity, messages[message_id])
+            for message_id, similarity in hits
+            if message_id in messages
+        ]
+        
+    def search_keyword(
+        self,
+        keyword: str,
+        conversation_id: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Find messages containing a keyword (case-insensitive).
+        
+        Uses the FTS5 index, best BM25 match first, when it is available and
+        the keyword is long enough to form a trigram; otherwise scans
+        messages in insertion order.
+        
+        Args:
+            keyword: Text to search for
+            conversation_id: Optional filter by conversation
+            limit: Maximum number of results
+            
+        Returns:
+            List of message dictionaries
+        """
+        try:
+            if self.fts_enabled and len(keyword) >= 3:
+                match = '"' + keyword.replace('"', '""') + '"'
+                return [message for _, _, message in self._search_fts(match, conversation_id, limit)]
+                
+            pattern = re.sub(r'([\\%_])', r'\\\1', keyword)
+            sql = """
+                SELECT id, conversation_id, role, content, timestamp, metadata
+                FROM messages
+                WHERE content LIKE ? ESCAPE '\\'
+            """
+            params: List[Any] = [f"%{pattern}%"]
+            if conversation_id is not None:
+                sql += " AND conversation_id = ?"
+                params.append(conversation_id)
+            sql += " ORDER BY id LIMIT ?"
+            params.append(limit)
+            
+            with self._reader() as conn:
+                rows = conn.cursor().execute(sql, params).fetchall()
+            return [self._message(row) for row in rows]
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error searching keyword: {e}")
+            raise
+            
+    def search_text(
+        self,
+        terms: Sequence[str],
+        conversation_id: Optional[str] = None,
+        limit: int = 10
+    ) -> Optional[List[Tuple[int, float, Dict[str, Any]]]]:
+        """
+        Rank messages matching any of the terms by BM25.
+        
+        Args:
+            terms: Search terms (terms shorter than 3 characters are ignored)
+            conversation_id: Optional filter by conversation
+            limit: Maximum number of results
+            
+        Returns:
+            List of (message_id, bm25_score, message_dict) tuples, best match
+            first with higher scores better, or None if FTS5 is unavailable
+        """
+        if not self.fts_enabled:
+            return None
+            
+        terms = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= 3]
+        if not terms:
+            return []
+            
+        try:
+            return self._search_fts(" OR ".join(terms), conversation_id, limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error searching text: {e}")
+            raise
+            
+    def _search_fts(
+        self,
+        match: str,
+        conversation_id: Optional[str],
+        limit: int
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Run an FTS5 MATCH query, returning (id, -bm25, message) best first."""
+        sql = """
+            SELECT
+                m.id,
+                m.conversation_id,
+                m.role,
+                m.content,
+                m.timestamp,
+                m.metadata,
+                bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params: List[Any] = [match]
+        if conversation_id is not None:
+            sql += " AND m.conversation_id = ?"
+            params.append(conversation_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        
+        with self._reader() as conn:
+            rows = conn.cursor().execute(sql, params).fetchall()
+        return [(row['id'], -row['rank'], self._message(row)) for row in rows]
+        
+    @staticmethod
+    def _message(row: sqlite3.Row) -> Dict[str, Any]:
+        """Build a message dict from a messages row."""
+        return {
+            'id': row['id'],
+            'conversation_id': row['conversation_id'],
+            'role': row['role'],
+            'content': row['content'],
+            'timestamp': row['timestamp'],
+            'metadata': decode_metadata(row['metadata'])
+        }
+        
+    @staticmethod
+    def _embedded_message(row: sqlite3.Row) -> Dict[str, Any]:
+        """Build a message dict from a messages/embeddings join row."""
+        message = Database._message(row)
+        message['embedding_model'] = row['model']
+        return message
+        
     def get_conversation_history(
         self,
         conversation_id: str,
-        limit: Optional[int] = 50
+        limit: Optional[int] = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
-        Get message history for a conversation.
+        Get the most recent messages of a conversation.
+        
+        Pages are keyed by message ID rather than an offset, so each page
+        costs the same however deep it is.
         
         Args:
             conversation_id: Conversation identifier
-            limit: Maximum number of messages to return
+            limit: Maximum number of messages to return (None for all)
+            before_id: Only return messages older than this message ID
+            after_id: Only return messages newer than this message ID; the
+                oldest of them are returned first, so passing the last ID of
+                one page fetches the next
             
         Returns:
-            List of message dictionaries
+            List of message dictionaries, oldest first
         """
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
+            # Walk idx_messages_conversation from the newest message (or
+            # before_id) backwards, or from after_id forwards, so only the
+            # rows returned are read
+            sql = """
                 SELECT 
                     id,
                     conversation_id,
@@ -277,21 +1543,22 @@ class Database:
                     metadata
                 FROM messages
                 WHERE conversation_id = ?
-                ORDER BY timestamp ASC
-                LIMIT ?
-            """, (conversation_id, limit))
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    'id': row['id'],
-                    'conversation_id': row['conversation_id'],
-                    'role': row['role'],
-                    'content': row['content'],
-                    'timestamp': row['timestamp'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else None
-                })
-                
+            """
+            params: List[Any] = [conversation_id]
+            if before_id is not None:
+                sql += " AND id < ?"
+                params.append(before_id)
+            if after_id is not None:
+                sql += " AND id > ?"
+                params.append(after_id)
+            sql += " ORDER BY id " + ("ASC" if after_id is not None else "DESC") + " LIMIT ?"
+            params.append(-1 if limit is None else limit)
+            
+            with self._reader() as conn:
+                messages = [self._message(row) for row in conn.cursor().execute(sql, params)]
+            if after_id is None:
+                messages.reverse()
+            
             logger.debug(f"Retrieved {len(messages)} messages from conversation {conversation_id}")
             return messages
             
@@ -312,6 +1579,17 @@ class Database:
         try:
             cursor = self.conn.cursor()
             
+            # Drop the conversation's vectors from the KNN index
+            if self._vec_dim is not None:
+                cursor.execute("""
+                    DELETE FROM vec_messages WHERE rowid IN (
+                        SELECT id FROM messages WHERE conversation_id = ?
+                    )
+                """, (conversation_id,))
+            elif self.ann is not None:
+                cursor.execute("SELECT id FROM messages WHERE conversation_id = ?", (conversation_id,))
+                self.ann.remove(row['id'] for row in cursor.fetchall())
+                
             # Delete messages (embeddings will cascade)
             cursor.execute("""
                 DELETE FROM messages WHERE conversation_id = ?
@@ -324,7 +1602,7 @@ class Database:
                 DELETE FROM conversations WHERE id = ?
             """, (conversation_id,))
             
-            self.conn.commit()
+            self._commit()
             
             logger.info(f"Deleted {deleted_count} messages from conversation {conversation_id}")
             return deleted_count
@@ -342,36 +1620,27 @@ class Database:
             Dictionary with statistics
         """
         try:
-            cursor = self.conn.cursor()
-            
-            # Total messages
-            cursor.execute("SELECT COUNT(*) as count FROM messages")
-            total_messages = cursor.fetchone()['count']
-            
-            # Total conversations
-            cursor.execute("SELECT COUNT(DISTINCT conversation_id) as count FROM messages")
-            total_conversations = cursor.fetchone()['count']
-            
-            # Total embeddings
-            cursor.execute("SELECT COUNT(*) as count FROM embeddings")
-            total_embeddings = cursor.fetchone()['count']
-            
-            # Date range
-            cursor.execute("""
-                SELECT 
-                    MIN(timestamp) as first_message,
-                    MAX(timestamp) as last_message
-                FROM messages
-            """)
-            date_range = cursor.fetchone()
-            
-            stats = {
-                'total_messages': total_messages,
-                'total_conversations': total_conversations,
-                'total_embeddings': total_embeddings,
-                'first_message': date_range['first_message'],
-                'last_message': date_range['last_message']
-            }
+            # One statement: both message counts come from a single pass over
+            # the covering conversation index, the embedding count from the
+            # (smaller) message_id index, and the date range from the first
+            # and last rows of the id B-tree
+            with self._reader() as conn:
+                row = conn.execute("""
+                    SELECT
+                        m.total_messages,
+                        m.total_conversations,
+                        (SELECT COUNT(*) FROM embeddings) as total_embeddings,
+                        (SELECT timestamp FROM messages ORDER BY id ASC LIMIT 1) as first_message,
+                        (SELECT timestamp FROM messages ORDER BY id DESC LIMIT 1) as last_message
+                    FROM (
+                        SELECT
+                            COUNT(*) as total_messages,
+                            COUNT(DISTINCT conversation_id) as total_conversations
+                        FROM messages
+                    ) m
+                """).fetchone()
+                
+            stats = dict(row)
             
             logger.debug(f"Database statistics: {stats}")
             return stats
@@ -380,9 +1649,32 @@ class Database:
             logger.error(f"Error getting statistics: {e}")
             raise
             
+    def get_conversation_ids(self) -> List[str]:
+        """
+        List the IDs of conversations that have messages.
+        
+        Returns:
+            Conversation identifiers
+        """
+        try:
+            with self._reader() as conn:
+                rows = conn.execute("SELECT DISTINCT conversation_id FROM messages").fetchall()
+            return [row['conversation_id'] for row in rows]
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error listing conversations: {e}")
+            raise
+            
     def close(self) -> None:
         """Close the database connection."""
+        if self.ann is not None:
+            self.ann.save()
+        if self._readers is not None:
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+            self._readers = None
         if self.conn:
+            self.flush()
             self.conn.close()
             logger.info("Database connection closed")
             
@@ -5,12 +5,32 @@ Handles OpenAI embeddings generation and vector similarity calculations.
 """
 
 import openai
+import asyncio
 from typing import List, Optional
 import numpy as np
 import logging
+from .kernels import cosine_scores, normalize, top_k_indices
 
 logger = logging.getLogger(__name__)
 
+# Line breaks and tabs become spaces before text is sent for embedding
+_WHITESPACE = str.maketrans("\n\r\t", "   ")
+
+
+def clean_text(text: str) -> str:
+    """
+    Flatten line breaks and tabs to spaces and strip surrounding whitespace.
+    
+    Uses a single str.translate pass instead of chained replace calls.
+    
+    Args:
+        text: Text to clean
+        
+    Returns:
+        Cleaned text
+    """
+    return text.translate(_WHITESPACE).strip()
+
 
 class EmbeddingService:
     """
@@ -22,10 +42,28 @@ class EmbeddingService:
     - Batch processing of embeddings
     """
     
+    # Maximum number of inputs accepted by one embeddings request
+    MAX_BATCH_SIZE = 2048
+    
+    # Module-level openai settings carried over to the AsyncOpenAI client, so
+    # async requests go where sync ones do (the sync http_client can't be)
+    CLIENT_SETTINGS = (
+        "api_key", "organization", "project", "base_url",
+        "timeout", "max_retries", "default_headers", "default_query",
+    )
+    
+    # Embedding dimensions of known models (others are assumed to be 1536)
+    MODEL_DIMENSIONS = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+    
     def __init__(
         self,
         api_key: Optional[str] = None,
-        model: str = "text-embedding-3-small"
+        model: str = "text-embedding-3-small",
+        concurrency: int = 8
     ):
         """
         Initialize the embedding service.
@@ -33,8 +71,16 @@ class EmbeddingService:
         Args:
             api_key: OpenAI API key (if None, uses environment variable)
             model: OpenAI embedding model to use
+            concurrency: Maximum number of embeddings requests in flight when
+                a bulk call needs more than one request
         """
         self.model = model
+        self.concurrency = concurrency
+        
+        # AsyncOpenAI client reused by embed_many_async, and the event loop
+        # it was created on (its connections can't move to another loop)
+        self._async_client: Optional[openai.AsyncOpenAI] = None
+        self._async_client_loop: Optional[asyncio.AbstractEventLoop] = None
         
         if api_key:
             openai.api_key = api_key
@@ -49,14 +95,14 @@ class EmbeddingService:
             text: Text to embed
             
         Returns:
-            Embedding vector as list of floats
+            Unit-norm embedding vector as list of floats
             
         Raises:
             Exception: If API call fails
         """
         try:
             # Clean and prepare text
-            text = text.replace("\n", " ").strip()
+            text = clean_text(text)
             
             if not text:
                 raise ValueError("Cannot generate embedding for empty text")
@@ -67,7 +113,8 @@ class EmbeddingService:
                 model=self.model
             )
             
-            embedding = response.data[0].embedding
+            # Unit length once here, so every later comparison is a dot product
+            embedding = normalize(response.data[0].embedding).tolist()
             logger.debug(f"Generated embedding of dimension {len(embedding)}")
             
             return embedding
@@ -87,11 +134,11 @@ class EmbeddingService:
             texts: List of texts to embed
             
         Returns:
-            List of embedding vectors
+            List of unit-norm embedding vectors
         """
         try:
             # Clean texts
-            cleaned_texts = [text.replace("\n", " ").strip() for text in texts]
+            cleaned_texts = list(map(clean_text, texts))
             
             # Filter out empty texts
             valid_texts = [text for text in cleaned_texts if text]
@@ -105,7 +152,7 @@ class EmbeddingService:
                 model=self.model
             )
             
-            embeddings = [item.embedding for item in response.data]
+            embeddings = normalize([item.embedding for item in response.data]).tolist()
             logger.debug(f"Generated {len(embeddings)} embeddings in batch")
             
             return embeddings
@@ -117,25 +164,160 @@ class EmbeddingService:
             logger.error(f"Error generating embeddings batch: {e}")
             raise
             
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many texts with as few API calls as possible.
+        
+        Unlike generate_embeddings_batch, every text must be non-empty so that
+        rows stay aligned with the input. Rows are scaled to unit length, so
+        cosine similarity between them is a plain dot product.
+        
+        When the texts need several requests, they are sent concurrently
+        (see embed_many_async) unless concurrency is 1 or an event loop is
+        already running in this thread.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            (N, d) float32 array of unit-norm embeddings, one row per text
+            
+        Raises:
+            ValueError: If any text is empty
+            Exception: If API call fails
+        """
+        try:
+            cleaned_texts = list(map(clean_text, texts))
+            
+            if not all(cleaned_texts):
+                raise ValueError("Cannot generate embedding for empty text")
+                
+            if self.concurrency > 1 and len(cleaned_texts) > self.MAX_BATCH_SIZE:
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    return asyncio.run(self._embed_with_temporary_client(cleaned_texts))
+                    
+            embeddings = []
+            for start in range(0, len(cleaned_texts), self.MAX_BATCH_SIZE):
+                response = openai.embeddings.create(
+                    input=cleaned_texts[start:start + self.MAX_BATCH_SIZE],
+                    model=self.model
+                )
+                embeddings.extend(item.embedding for item in response.data)
+                
+            logger.debug(f"Generated {len(embeddings)} embeddings in bulk")
+            return normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(cleaned_texts), -1))
+            
+        except openai.APIError as e:
+            logger.error(f"OpenAI API error in bulk embedding: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            raise
+            
+    async def embed_many_async(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many texts with concurrent API requests.
+        
+        Texts are split into requests of at most MAX_BATCH_SIZE inputs, with
+        no more than concurrency requests in flight at once. Calls on the same
+        event loop share one AsyncOpenAI client, so connections are reused;
+        close it with aclose() when done.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            (N, d) float32 array of unit-norm embeddings, one row per text
+            
+        Raises:
+            ValueError: If any text is empty
+            Exception: If API call fails
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = self._new_async_client()
+            self._async_client_loop = loop
+        return await self._embed_chunks(self._async_client, texts)
+        
+    async def aclose(self) -> None:
+        """Close the AsyncOpenAI client kept by embed_many_async, if any."""
+        client, self._async_client, self._async_client_loop = self._async_client, None, None
+        if client is not None:
+            await client.close()
+            
+    def _new_async_client(self) -> openai.AsyncOpenAI:
+        """Build an AsyncOpenAI client with the module-level openai settings."""
+        return openai.AsyncOpenAI(**{
+            name: getattr(openai, name) for name in self.CLIENT_SETTINGS if hasattr(openai, name)
+        })
+        
+    async def _embed_with_temporary_client(self, texts: List[str]) -> np.ndarray:
+        """Embed texts on a client closed before returning (for one-off event loops)."""
+        client = self._new_async_client()
+        try:
+            return await self._embed_chunks(client, texts)
+        finally:
+            await client.close()
+            
+    async def _embed_chunks(self, client: openai.AsyncOpenAI, texts: List[str]) -> np.ndarray:
+        """Send texts to the API in concurrent requests on the given client."""
+        cleaned_texts = list(map(clean_text, texts))
+        
+        if not all(cleaned_texts):
+            raise ValueError("Cannot generate embedding for empty text")
+            
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        
+        async def embed_chunk(chunk: List[str]) -> List[List[float]]:
+            async with semaphore:
+                response = await client.embeddings.create(input=chunk, model=self.model)
+                return [item.embedding for item in response.data]
+                
+        try:
+            chunks = await asyncio.gather(*(
+                embed_chunk(cleaned_texts[start:start + self.MAX_BATCH_SIZE])
+                for start in range(0, len(cleaned_texts), self.MAX_BATCH_SIZE)
+            ))
+            embeddings = [embedding for chunk in chunks for embedding in chunk]
+            
+            logger.debug(f"Generated {len(embeddings)} embeddings in {len(chunks)} requests")
+            return normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(cleaned_texts), -1))
+            
+        except openai.APIError as e:
+            logger.error(f"OpenAI API error in bulk embedding: {e}")
+            raise
+            
     @staticmethod
-    def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
+    def cosine_similarity(
+        vec1: List[float],
+        vec2: List[float],
+        assume_normalized: bool = False
+    ) -> float:
         """
         Calculate cosine similarity between two vectors.
         
         Args:
             vec1: First vector
             vec2: Second vector
+            assume_normalized: Whether both vectors already have unit norm
+                (as returned by generate_embedding), so the similarity is
+                just their dot product
             
         Returns:
             Cosine similarity score (0 to 1)
         """
         try:
-            # Convert to numpy arrays for efficient computation
-            v1 = np.array(vec1)
-            v2 = np.array(vec2)
+            # asarray doesn't copy inputs that are already arrays
+            v1 = np.asarray(vec1)
+            v2 = np.asarray(vec2)
             
+            if assume_normalized:
+                return max(0.0, min(1.0, float(np.inner(v1, v2))))
+                
             # Calculate cosine similarity
-            dot_product = np.dot(v1, v2)
+            dot_product = np.inner(v1, v2)
             norm_v1 = np.linalg.norm(v1)
             norm_v2 = np.linalg.norm(v2)
             
@@ -158,7 +340,8 @@ class EmbeddingService:
         query_embedding: List[float],
         embeddings: List[tuple],
         top_k: int = 5,
-        threshold: float = 0.0
+        threshold: float = 0.0,
+        normalized: bool = False
     ) -> List[tuple]:
         """
         Find the most similar embeddings to a query embedding.
@@ -168,22 +351,25 @@ class EmbeddingService:
             embeddings: List of (id, embedding_vector, data) tuples
             top_k: Number of results to return
             threshold: Minimum similarity threshold
+            normalized: Whether all vectors already have unit norm (skips
+                the per-row norm computation)
             
         Returns:
             List of (id, similarity_score, data) tuples, sorted by similarity
         """
         try:
-            similarities = []
-            
-            for item_id, embedding_vec, data in embeddings:
-                similarity = self.cosine_similarity(query_embedding, embedding_vec)
+            if not embeddings:
+                return []
                 
-                if similarity >= threshold:
-                    similarities.append((item_id, similarity, data))
-                    
-            # Sort by similarity (descending) and take top_k
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            results = similarities[:top_k]
+            # Stack candidates into one contiguous matrix and score them in a single call
+            matrix = np.asarray([item[1] for item in embeddings], dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = cosine_scores(matrix, query, normalized=normalized)
+            
+            results = [
+                (embeddings[i][0], float(scores[i]), embeddings[i][2])
+                for i in top_k_indices(scores, top_k, threshold)
+            ]
             
             logger.debug(f"Found {len(results)} similar items (threshold: {threshold})")
             return results
@@ -199,11 +385,4 @@ class EmbeddingService:
         Returns:
             Embedding dimension
         """
-        # Map of known models to dimensions
-        dimensions = {
-            "text-embedding-3-small": 1536,
-            "text-embedding-3-large": 3072,
-            "text-embedding-ada-002": 1536,
-        }
-        
-        return dimensions.get(self.model, 1536)
+        return self.MODEL_DIMENSIONS.get(self.model, 1536)
@@ -4,12 +4,22 @@ Core Memory Engine for Mini Memori.
 Main interface for saving and retrieving memories with embeddings.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Sequence, Union
+import asyncio
+import functools
+import heapq
+import re
+import time
+import numpy as np
 import logging
 from .database import Database
+from .cache import LRUCache, SemanticCache
 from .embeddings import EmbeddingService
+from .kernels import (
+    cosine_scores, int8_cosine_scores, int8_norms, score_and_filter, top_k_indices
+)
 from .config import get_config
-from .utils import validate_message_data, sanitize_conversation_id
+from .utils import Message, validate_message_data, sanitize_conversation_id, content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +35,36 @@ class MemoryEngine:
     - Getting database statistics
     """
     
+    # Weight of the BM25 keyword score in hybrid retrieval
+    KEYWORD_WEIGHT = 0.4
+    
+    # Candidates fetched from each index per requested hybrid result
+    HYBRID_POOL_FACTOR = 4
+    
+    # save_message_async embeds messages arriving within this many seconds
+    # of each other in one request, of at most EMBED_BATCH_SIZE inputs
+    EMBED_BATCH_WINDOW = 0.02
+    EMBED_BATCH_SIZE = 64
+    
+    # Seconds get_statistics serves counters kept up to date in process
+    # before re-reading them from the database (to see other writers)
+    STATS_TTL = 60.0
+    
     def __init__(
         self,
         db_path: Optional[str] = None,
         embedding_model: Optional[str] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        query_cache_size: int = 128,
+        query_cache_threshold: float = 0.97,
+        embedding_cache: bool = True,
+        embedding_cache_size: int = 1024,
+        quantize_embeddings: bool = False,
+        read_connections: int = 0,
+        dedup_threshold: Optional[float] = None,
+        scan_batch_size: Optional[int] = None
     ):
         """
         Initialize the Memory Engine.
@@ -38,13 +73,42 @@ class MemoryEngine:
             db_path: Path to SQLite database (uses config default if None)
             embedding_model: OpenAI embedding model (uses config default if None)
             api_key: OpenAI API key (uses config/env if None)
+            journal_mode: SQLite journal mode passed to the database
+            synchronous: SQLite synchronous level passed to the database
+            query_cache_size: Number of retrieval results to keep in the
+                semantic query cache (0 disables caching)
+            query_cache_threshold: Minimum cosine similarity between two
+                queries for a cached result to be reused
+            embedding_cache: Store embeddings in the database by content hash
+                so identical text is only sent to the API once
+            embedding_cache_size: Number of cached embeddings also kept in
+                process, so hot text skips the database lookup
+            quantize_embeddings: Store message embeddings as int8 (4x smaller,
+                slightly lower precision) and score the linear-scan fallback
+                on int8 as well
+            read_connections: Read-only connections to pool for retrieval,
+                for engines shared by several threads (0 disables the pool)
+            dedup_threshold: Cosine similarity at or above which a new message
+                replaces the most similar message of the same role in its
+                conversation instead of being inserted (uses config default
+                if None; disabled when neither is set)
+            scan_batch_size: Stream the linear-scan fallback from the database
+                in batches of this many rows, keeping a running top-k, instead
+                of caching each conversation's whole embedding matrix (None
+                caches; trades query latency for bounded memory)
         """
         # Load configuration
         config = get_config()
         
         # Initialize database
         self.db_path = db_path or config.db_path
-        self.db = Database(self.db_path)
+        self.db = Database(
+            self.db_path,
+            journal_mode=journal_mode,
+            synchronous=synchronous,
+            quantize=quantize_embeddings,
+            read_connections=read_connections
+        )
         
         # Initialize embedding service
         self.embedding_model = embedding_model or config.embedding_model
@@ -61,6 +125,38 @@ class MemoryEngine:
             model=self.embedding_model
         )
         
+        self.embedding_cache = embedding_cache
+        self._hot_embeddings = LRUCache(embedding_cache_size)
+        self.dedup_threshold = (
+            dedup_threshold if dedup_threshold is not None else config.dedup_threshold
+        )
+        self.scan_batch_size = scan_batch_size
+        
+        # Query caches: exact text -> embedding, similar query -> results
+        self._query_embeddings = LRUCache(query_cache_size)
+        self._query_cache = SemanticCache(query_cache_size, query_cache_threshold)
+        
+        # Embedding matrices for the linear-scan fallback, keyed by
+        # (conversation_id or None for all, dimension). Values are (matrix,
+        # messages, row norms); int8 matrices carry their norms, float32
+        # ones are unit length and carry None
+        self._matrix_cache: Dict[
+            Tuple[Optional[str], int], Tuple[np.ndarray, list, Optional[np.ndarray]]
+        ] = {}
+        # Bumped by every invalidation, so a matrix loaded concurrently with a
+        # write isn't cached
+        self._cache_generation = 0
+        
+        # Messages from save_message_async waiting to be embedded together
+        self._pending: List[Tuple[asyncio.Future, int, str, str]] = []
+        self._pending_flush: Optional[asyncio.TimerHandle] = None
+        self._embed_tasks: set = set()
+        
+        # get_statistics counters, updated by this engine's own writes
+        self._stats: Optional[Dict[str, Any]] = None
+        self._stats_conversations: set = set()
+        self._stats_loaded_at = 0.0
+        
         logger.info(
             f"MemoryEngine initialized (db: {self.db_path}, "
             f"model: {self.embedding_model})"
@@ -100,41 +196,232 @@ class MemoryEngine:
             # Sanitize conversation ID
             safe_conv_id = sanitize_conversation_id(conversation_id)
             
-            # Save message to database
-            message_id = self.db.save_message(
-                conversation_id=safe_conv_id,
-                role=role,
-                content=content,
-                metadata=metadata
-            )
-            
-            # Generate and save embedding
+            # Generate the embedding before taking the database write lock
+            embedding = None
             if generate_embedding:
                 try:
-                    embedding = self.embeddings.generate_embedding(content)
-                    self.db.save_embedding(
-                        message_id=message_id,
-                        embedding=embedding,
-                        model=self.embedding_model
-                    )
-                    logger.debug(f"Generated embedding for message {message_id}")
+                    embedding = self._embed(content)
                 except Exception as e:
                     logger.error(f"Failed to generate embedding: {e}")
                     # Continue even if embedding fails
                     
-            logger.info(f"Saved message {message_id} to conversation {safe_conv_id}")
+            duplicate_id = None
+            if embedding is not None:
+                duplicate_id = self._find_duplicate(embedding, safe_conv_id, role)
+                
+            # Save message and embedding with a single commit
+            with self.db.batch():
+                if duplicate_id is not None:
+                    self.db.refresh_message(duplicate_id, content, metadata)
+                    message_id = duplicate_id
+                else:
+                    message_id = self.db.save_message(
+                        conversation_id=safe_conv_id,
+                        role=role,
+                        content=content,
+                        metadata=metadata
+                    )
+                    if embedding is not None:
+                        self.db.save_embedding(
+                            message_id=message_id,
+                            embedding=embedding,
+                            model=self.embedding_model
+                        )
+                        
+            self._invalidate_caches([safe_conv_id])
+            if duplicate_id is None:
+                self._record_saved([safe_conv_id], 1, int(embedding is not None))
+            # Per-message logging stays at DEBUG with lazy formatting so that
+            # loops of save_message calls don't pay for it
+            logger.debug("Saved message %d to conversation %s", message_id, safe_conv_id)
             return message_id
             
         except Exception as e:
             logger.error(f"Error saving message: {e}")
             raise
             
+    def save_messages(
+        self,
+        messages: Sequence[Union[Message, Dict[str, Any]]],
+        generate_embeddings: bool = True
+    ) -> List[int]:
+        """
+        Save several messages with their embeddings in a single transaction.
+        
+        Args:
+            messages: Message rows, or dicts with 'role' and 'content' keys and
+                optional 'conversation_id' (defaults to "default") and
+                'metadata' keys
+            generate_embeddings: Whether to generate and store embeddings
+            
+        Returns:
+            List of message IDs, in the same order as messages
+            
+        Raises:
+            ValueError: If any message is invalid
+            Exception: If save operation fails
+        """
+        try:
+            start = time.perf_counter()
+            rows = []
+            for message in messages:
+                if not isinstance(message, Message):
+                    message = Message(
+                        message.get('role'),
+                        message.get('content'),
+                        message.get('conversation_id', "default"),
+                        message.get('metadata')
+                    )
+                    
+                is_valid, error_msg = validate_message_data(
+                    message.role, message.content, message.conversation_id
+                )
+                if not is_valid:
+                    raise ValueError(error_msg)
+                    
+                rows.append((
+                    sanitize_conversation_id(message.conversation_id),
+                    message.role,
+                    message.content,
+                    message.metadata
+                ))
+                
+            # Embed all messages in one API call before opening the write transaction
+            embeddings = None
+            if generate_embeddings and rows:
+                try:
+                    embeddings = self._embed_many([row[2] for row in rows])
+                except Exception as e:
+                    logger.error(f"Failed to generate embeddings: {e}")
+                    # Continue even if embedding fails
+                    
+            duplicates = {}
+            if embeddings is not None:
+                for i, (conv_id, role, _, _) in enumerate(rows):
+                    duplicate_id = self._find_duplicate(embeddings[i], conv_id, role)
+                    if duplicate_id is not None:
+                        duplicates[i] = duplicate_id
+                        
+            if not duplicates:
+                message_ids = self.db.save_messages(
+                    rows,
+                    embeddings=embeddings,
+                    model=self.embedding_model
+                )
+            else:
+                fresh = [i for i in range(len(rows)) if i not in duplicates]
+                with self.db.batch():
+                    fresh_ids = self.db.save_messages(
+                        [rows[i] for i in fresh],
+                        embeddings=embeddings[fresh],
+                        model=self.embedding_model
+                    )
+                    for i, duplicate_id in duplicates.items():
+                        self.db.refresh_message(duplicate_id, rows[i][2], rows[i][3])
+                ids_by_row = dict(zip(fresh, fresh_ids))
+                ids_by_row.update(duplicates)
+                message_ids = [ids_by_row[i] for i in range(len(rows))]
+                
+            self._invalidate_caches([row[0] for row in rows])
+            saved = len(rows) - len(duplicates)
+            self._record_saved([row[0] for row in rows], saved, saved if embeddings is not None else 0)
+            logger.info(
+                "Saved %d messages in %.2fs", len(message_ids), time.perf_counter() - start
+            )
+            return message_ids
+            
+        except Exception as e:
+            logger.error(f"Error saving messages: {e}")
+            raise
+            
+    async def save_message_async(
+        self,
+        role: str,
+        content: str,
+        conversation_id: str = "default",
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Save a message, embedding it together with other messages saved concurrently.
+        
+        The message row is written immediately. Its text then joins a queue
+        that is embedded in one API request once EMBED_BATCH_WINDOW passes or
+        EMBED_BATCH_SIZE messages are waiting, so many saves gathered at once
+        cost a few requests instead of one each. Returns once the embedding
+        is stored (or has failed, in which case the message is kept without
+        one, as in save_message). Near-duplicate folding is not applied.
+        
+        Args:
+            role: Message role (user, assistant, system)
+            content: Message content
+            conversation_id: Conversation identifier
+            metadata: Optional metadata dictionary
+            
+        Returns:
+            Message ID
+            
+        Raises:
+            ValueError: If message data is invalid
+        """
+        is_valid, error_msg = validate_message_data(role, content, conversation_id)
+        if not is_valid:
+            raise ValueError(error_msg)
+            
+        safe_conv_id = sanitize_conversation_id(conversation_id)
+        message_id = self.db.save_message(safe_conv_id, role, content, metadata)
+        self._invalidate_caches([safe_conv_id])
+        self._record_saved([safe_conv_id], 1, 0)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((future, message_id, content, safe_conv_id))
+        if len(self._pending) >= self.EMBED_BATCH_SIZE:
+            self._flush_pending()
+        elif self._pending_flush is None:
+            self._pending_flush = loop.call_later(self.EMBED_BATCH_WINDOW, self._flush_pending)
+            
+        await future
+        return message_id
+        
+    def _flush_pending(self) -> None:
+        """Start embedding every queued message as one batch."""
+        if self._pending_flush is not None:
+            self._pending_flush.cancel()
+            self._pending_flush = None
+            
+        batch, self._pending = self._pending, []
+        if batch:
+            # Keep a reference so the task isn't garbage collected mid-flight
+            task = asyncio.ensure_future(self._embed_pending(batch))
+            self._embed_tasks.add(task)
+            task.add_done_callback(self._embed_tasks.discard)
+            
+    async def _embed_pending(self, batch: List[Tuple[asyncio.Future, int, str, str]]) -> None:
+        """Embed a batch of saved messages and store the embeddings."""
+        try:
+            embeddings = await self._embed_many_async([text for _, _, text, _ in batch])
+            self.db.save_embeddings(
+                [(message_id, embedding) for (_, message_id, _, _), embedding in zip(batch, embeddings)],
+                self.embedding_model
+            )
+            self._invalidate_caches([conv_id for _, _, _, conv_id in batch])
+            self._record_saved([], 0, len(batch))
+            logger.debug("Embedded %d queued messages in one batch", len(batch))
+        except Exception as e:
+            logger.error(f"Failed to generate embeddings: {e}")
+            # Messages stay saved without embeddings
+            
+        for future, _, _, _ in batch:
+            if not future.done():
+                future.set_result(None)
+                
     def retrieve_memories(
         self,
         query: str,
         top_k: int = 5,
         conversation_id: Optional[str] = None,
-        threshold: float = 0.0
+        threshold: float = 0.0,
+        hybrid: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Retrieve the most relevant memories based on a query.
@@ -144,6 +431,8 @@ class MemoryEngine:
             top_k: Number of results to return
             conversation_id: Optional filter by conversation
             threshold: Minimum similarity threshold (0-1)
+            hybrid: Blend BM25 keyword scores with cosine similarity;
+                the threshold then applies to the blended score
             
         Returns:
             List of memory dictionaries with similarity scores
@@ -151,71 +440,423 @@ class MemoryEngine:
         try:
             # Generate query embedding
             logger.debug(f"Retrieving memories for query: {query[:50]}...")
-            query_embedding = self.embeddings.generate_embedding(query)
+            query_embedding = self._query_embeddings.get(query)
+            if query_embedding is None:
+                query_embedding = self._embed(query, persist=False)
+                self._query_embeddings.put(query, query_embedding)
+            safe_conv_id = sanitize_conversation_id(conversation_id) if conversation_id else None
             
-            # Get all embeddings from database
-            all_embeddings = self.db.get_all_embeddings()
+            return self._retrieve(query, query_embedding, top_k, safe_conv_id, threshold, hybrid)
             
-            if not all_embeddings:
-                logger.warning("No embeddings found in database")
-                return []
-                
-            # Filter by conversation if specified
-            if conversation_id:
-                safe_conv_id = sanitize_conversation_id(conversation_id)
-                all_embeddings = [
-                    (msg_id, emb, data) for msg_id, emb, data in all_embeddings
-                    if data['conversation_id'] == safe_conv_id
-                ]
-                logger.debug(f"Filtered to {len(all_embeddings)} embeddings from conversation")
-                
-            # Find most similar
-            similar_items = self.embeddings.find_most_similar(
-                query_embedding=query_embedding,
-                embeddings=all_embeddings,
-                top_k=top_k,
-                threshold=threshold
-            )
+        except Exception as e:
+            logger.error(f"Error retrieving memories: {e}")
+            raise
             
-            # Format results
-            results = []
-            for msg_id, similarity, data in similar_items:
-                result = {
-                    'id': data['id'],
-                    'conversation_id': data['conversation_id'],
-                    'role': data['role'],
-                    'content': data['content'],
-                    'timestamp': data['timestamp'],
-                    'similarity': similarity,
-                    'metadata': data.get('metadata')
-                }
-                results.append(result)
+    async def retrieve_memories_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        conversation_id: Optional[str] = None,
+        threshold: float = 0.0,
+        hybrid: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve memories without blocking the event loop on the embeddings request.
+        
+        Only the query's embeddings request is awaited; ranking runs on the
+        event loop thread, like every other use of the writer connection.
+        When retrieval will fall back to the linear scan and the database has
+        a read pool (read_connections), the scan matrix is loaded on a pooled
+        connection in a worker thread while the request is in flight, so
+        latency is the slower of the two rather than their sum. Arguments and
+        results match retrieve_memories.
+        """
+        try:
+            safe_conv_id = sanitize_conversation_id(conversation_id) if conversation_id else None
+            query_embedding = self._query_embeddings.get(query)
+            if query_embedding is None:
+                embed = self._embed_many_async([query], persist=False)
+                key = (safe_conv_id, self.embeddings.get_embedding_dimension())
+                if (
+                    self.db.read_pool_enabled
+                    and not self.db.in_transaction
+                    and not self.db.knn_enabled
+                    and self.scan_batch_size is None
+                    and key not in self._matrix_cache
+                ):
+                    generation = self._cache_generation
+                    # run_in_executor rather than asyncio.to_thread, which is 3.9+
+                    load = asyncio.get_running_loop().run_in_executor(
+                        None, functools.partial(self._read_matrix, *key, committed=True)
+                    )
+                    embeddings, loaded = await asyncio.gather(embed, load)
+                    # A write while the matrix loaded may have been missed
+                    if generation == self._cache_generation:
+                        self._matrix_cache[key] = loaded
+                else:
+                    embeddings = await embed
+                query_embedding = embeddings[0]
+                self._query_embeddings.put(query, query_embedding)
                 
-            logger.info(f"Retrieved {len(results)} memories (threshold: {threshold})")
-            return results
+            return self._retrieve(query, query_embedding, top_k, safe_conv_id, threshold, hybrid)
             
         except Exception as e:
             logger.error(f"Error retrieving memories: {e}")
             raise
             
+    def _retrieve(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        top_k: int,
+        safe_conv_id: Optional[str],
+        threshold: float,
+        hybrid: bool
+    ) -> List[Dict[str, Any]]:
+        """Rank memories for an embedded query (see retrieve_memories)."""
+        # Reuse results of a near-identical earlier query, rescored for this
+        # one. Hybrid scores also depend on the query's keywords, so those are
+        # only reused for the same text
+        cache_key = (top_k, safe_conv_id, threshold, hybrid, query if hybrid else None)
+        cached = self._query_cache.get(query_embedding, cache_key)
+        if cached is not None:
+            cached_embedding, cached = cached
+            if not hybrid and not np.array_equal(cached_embedding, query_embedding):
+                cached = self._rescore(cached, query_embedding, threshold)
+            logger.info(f"Retrieved {len(cached)} memories from query cache")
+            return [dict(result) for result in cached]
+            
+        if hybrid:
+            pool = top_k * self.HYBRID_POOL_FACTOR
+            similar_items = self._hybrid_rerank(
+                query,
+                self._semantic_search(query_embedding, pool, safe_conv_id, 0.0),
+                top_k,
+                safe_conv_id,
+                threshold
+            )
+        else:
+            similar_items = self._semantic_search(
+                query_embedding, top_k, safe_conv_id, threshold
+            )
+            
+        # Format results
+        results = []
+        for msg_id, similarity, data in similar_items:
+            result = {
+                'id': data['id'],
+                'conversation_id': data['conversation_id'],
+                'role': data['role'],
+                'content': data['content'],
+                'timestamp': data['timestamp'],
+                'similarity': similarity,
+                'metadata': data.get('metadata')
+            }
+            results.append(result)
+            
+        self._query_cache.put(
+            query_embedding, cache_key, (query_embedding, [dict(result) for result in results])
+        )
+        logger.info(f"Retrieved {len(results)} memories (threshold: {threshold})")
+        return results
+        
+    def _rescore(
+        self,
+        results: List[Dict[str, Any]],
+        query_embedding: np.ndarray,
+        threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Score cached results against the current query.
+        
+        The cached ranking came from a similar but not identical query, so
+        similarities are recomputed from the stored embeddings, then results
+        are re-sorted and the threshold applied again.
+        """
+        stored = self.db.get_message_embeddings(
+            [result['id'] for result in results], query_embedding.shape[0]
+        )
+        results = [result for result in results if result['id'] in stored]
+        if not results:
+            return []
+            
+        matrix = np.stack([stored[result['id']] for result in results])
+        scores = cosine_scores(matrix, np.asarray(query_embedding, dtype=np.float32))
+        rescored = []
+        for result, score in zip(results, scores):
+            similarity = max(0.0, min(1.0, float(score)))
+            if similarity >= threshold:
+                rescored.append(dict(result, similarity=similarity))
+        rescored.sort(key=lambda result: result['similarity'], reverse=True)
+        return rescored
+        
+    def _find_duplicate(
+        self,
+        embedding: np.ndarray,
+        conversation_id: str,
+        role: str
+    ) -> Optional[int]:
+        """Return the ID of a message the embedding nearly duplicates, if dedup is on."""
+        if self.dedup_threshold is None:
+            return None
+            
+        hits = self._semantic_search(embedding, 1, conversation_id, self.dedup_threshold)
+        if hits and hits[0][2]['role'] == role:
+            logger.debug("Message duplicates %d (similarity %.3f)", hits[0][0], hits[0][1])
+            return hits[0][0]
+        return None
+        
+    def _embed(self, text: str, persist: bool = True) -> np.ndarray:
+        """Embed a single text as a unit vector, using the embedding cache when enabled."""
+        if not self.embedding_cache:
+            return np.asarray(self.embeddings.generate_embedding(text), dtype=np.float32)
+        return self._embed_many([text], persist)[0]
+        
+    def _embed_many(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """
+        Embed texts as unit vectors, calling the API only for text not
+        already cached.
+        
+        Lookups go to the in-process LRU first, then the database cache.
+        Duplicates within texts are embedded once. With persist=False fresh
+        embeddings are kept only in the in-process LRU; queries use this so
+        the database cache, which never evicts, holds only stored content.
+        """
+        if not self.embedding_cache:
+            return self.embeddings.embed_many(texts)
+            
+        hashes, cached, missing = self._lookup_embeddings(texts)
+        if missing:
+            fresh = self.embeddings.embed_many(list(missing.values()))
+            self._store_embeddings(list(missing), fresh, cached, persist)
+            
+        logger.debug(f"Embedded {len(texts)} texts ({len(missing)} API inputs)")
+        return np.stack([cached[h] for h in hashes])
+        
+    async def _embed_many_async(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """
+        Embed texts like _embed_many, awaiting the API request.
+        
+        Only the request is awaited; cache lookups and writes run on the
+        event loop thread, like every other use of the database connection.
+        """
+        if not self.embedding_cache:
+            return await self.embeddings.embed_many_async(texts)
+            
+        hashes, cached, missing = self._lookup_embeddings(texts)
+        if missing:
+            fresh = await self.embeddings.embed_many_async(list(missing.values()))
+            self._store_embeddings(list(missing), fresh, cached, persist)
+            
+        logger.debug(f"Embedded {len(texts)} texts ({len(missing)} API inputs)")
+        return np.stack([cached[h] for h in hashes])
+        
+    def _lookup_embeddings(
+        self,
+        texts: List[str]
+    ) -> Tuple[List[bytes], Dict[bytes, np.ndarray], Dict[bytes, str]]:
+        """
+        Find cached embeddings for texts by content hash.
+        
+        Returns the texts' hashes, the embeddings found by hash, and the
+        distinct texts still to embed by hash.
+        """
+        hashes = [content_hash(text) for text in texts]
+        text_by_hash = dict(zip(hashes, texts))
+        
+        cached = {}
+        for h in text_by_hash:
+            embedding = self._hot_embeddings.get(h)
+            if embedding is not None:
+                cached[h] = embedding
+        cold = [h for h in text_by_hash if h not in cached]
+        if cold:
+            stored = self.db.get_cached_embeddings(cold, self.embedding_model)
+            for h, embedding in stored.items():
+                self._hot_embeddings.put(h, embedding)
+            cached.update(stored)
+            
+        missing = {h: text_by_hash[h] for h in cold if h not in cached}
+        return hashes, cached, missing
+        
+    def _store_embeddings(
+        self,
+        hashes: List[bytes],
+        embeddings: np.ndarray,
+        cached: Dict[bytes, np.ndarray],
+        persist: bool = True
+    ) -> None:
+        """Add freshly generated embeddings to the caches and to cached."""
+        if persist:
+            self.db.cache_embeddings(list(zip(hashes, embeddings)), self.embedding_model)
+        for h, embedding in zip(hashes, embeddings):
+            self._hot_embeddings.put(h, embedding)
+            cached[h] = embedding
+        
+    def _semantic_search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        conversation_id: Optional[str],
+        threshold: float
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Find the top-k messages by cosine similarity to the query embedding."""
+        # Use the in-database KNN index when available
+        similar_items = self.db.search_embeddings(
+            query_embedding,
+            top_k=top_k,
+            conversation_id=conversation_id
+        )
+        
+        if similar_items is not None:
+            return [item for item in similar_items if item[1] >= threshold]
+            
+        if self.scan_batch_size is not None:
+            return self._stream_search(query_embedding, top_k, conversation_id, threshold)
+            
+        # Scan the (cached) embedding matrix for the conversation
+        matrix, messages, norms = self._load_matrix(conversation_id, query_embedding.shape[0])
+        
+        if not messages:
+            logger.warning("No embeddings found in database")
+            return []
+            
+        if norms is not None:
+            scores = int8_cosine_scores(matrix, query_embedding, norms)
+        else:
+            # Rows are normalized on load, so cosine is a dot product
+            scores = cosine_scores(matrix, query_embedding, normalized=True)
+        return [
+            (messages[i]['id'], float(scores[i]), messages[i])
+            for i in top_k_indices(scores, top_k, threshold)
+        ]
+        
+    def _stream_search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        conversation_id: Optional[str],
+        threshold: float
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """Scan the stored embeddings batch by batch, merging each batch's top-k."""
+        best: List[Tuple[int, float, Dict[str, Any]]] = []
+        batches = self.db.iter_embedding_batches(
+            query_embedding.shape[0], conversation_id, self.scan_batch_size
+        )
+        for matrix, messages in batches:
+            scores = cosine_scores(matrix, query_embedding, normalized=True)
+            hits = [
+                (messages[i]['id'], float(scores[i]), messages[i])
+                for i in top_k_indices(scores, top_k, threshold)
+            ]
+            # nlargest is stable, so ties keep the newest-first scan order
+            best = heapq.nlargest(top_k, best + hits, key=lambda item: item[1])
+            
+        return best
+        
+    def _load_matrix(
+        self,
+        conversation_id: Optional[str],
+        dimension: int
+    ) -> Tuple[np.ndarray, list, Optional[np.ndarray]]:
+        """Return the scan matrix for a conversation, loading it on a cache miss."""
+        key = (conversation_id, dimension)
+        if key not in self._matrix_cache:
+            self._matrix_cache[key] = self._read_matrix(conversation_id, dimension)
+        return self._matrix_cache[key]
+        
+    def _read_matrix(
+        self,
+        conversation_id: Optional[str],
+        dimension: int,
+        committed: bool = False
+    ) -> Tuple[np.ndarray, list, Optional[np.ndarray]]:
+        """
+        Load the scan matrix for a conversation from the database.
+        
+        Touches no engine state, so with committed (reading through the
+        database's read pool) it's safe to call from a worker thread.
+        """
+        if self.db.quantize:
+            codes, messages = self.db.load_embedding_codes(dimension, conversation_id, committed)
+            return codes, messages, int8_norms(codes)
+        matrix, messages = self.db.load_embedding_matrix(dimension, conversation_id, committed)
+        return matrix, messages, None
+        
+    def _invalidate_caches(self, conversation_ids: List[str]) -> None:
+        """Drop cached results and matrices that a write to these conversations affects."""
+        self._cache_generation += 1
+        self._query_cache.clear()
+        changed = set(conversation_ids)
+        for key in list(self._matrix_cache):
+            if key[0] is None or key[0] in changed:
+                del self._matrix_cache[key]
+                
+    def _hybrid_rerank(
+        self,
+        query: str,
+        semantic_items: List[Tuple[int, float, Dict[str, Any]]],
+        top_k: int,
+        conversation_id: Optional[str],
+        threshold: float
+    ) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """
+        Merge semantic and BM25 candidates and rank them by blended score.
+        
+        BM25 scores are normalized to [0, 1] by the best keyword hit. A
+        candidate found by only one index scores 0 on the other.
+        """
+        keyword_items = self.db.search_text(
+            re.findall(r'\w+', query),
+            conversation_id=conversation_id,
+            limit=top_k * self.HYBRID_POOL_FACTOR
+        ) or []
+        
+        candidates = {msg_id: [similarity, 0.0, data] for msg_id, similarity, data in semantic_items}
+        best_keyword = max((score for _, score, _ in keyword_items), default=0.0)
+        for msg_id, score, data in keyword_items:
+            candidate = candidates.setdefault(msg_id, [0.0, 0.0, data])
+            candidate[1] = score / best_keyword if best_keyword > 0 else 0.0
+            
+        if not candidates:
+            return []
+            
+        ids = list(candidates)
+        _, scores = score_and_filter(
+            np.array([candidates[msg_id][0] for msg_id in ids]),
+            threshold,
+            bm25=np.array([candidates[msg_id][1] for msg_id in ids]),
+            alpha=1.0 - self.KEYWORD_WEIGHT
+        )
+        
+        return [
+            (ids[i], float(scores[i]), candidates[ids[i]][2])
+            for i in top_k_indices(scores, top_k, threshold)
+        ]
+        
     def get_conversation_history(
         self,
         conversation_id: str = "default",
-        limit: int = 50
+        limit: int = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Get recent messages from a conversation.
         
         Args:
             conversation_id: Conversation identifier
-            limit: Maximum number of messages to return
+            limit: Maximum number of (most recent) messages to return
+            before_id: Only return messages older than this message ID
+            after_id: Only return messages newer than this message ID,
+                starting from the oldest (for paging forward)
             
         Returns:
             List of message dictionaries ordered by timestamp
         """
         try:
             safe_conv_id = sanitize_conversation_id(conversation_id)
-            messages = self.db.get_conversation_history(safe_conv_id, limit)
+            messages = self.db.get_conversation_history(safe_conv_id, limit, before_id, after_id)
             
             logger.info(f"Retrieved {len(messages)} messages from conversation {safe_conv_id}")
             return messages
@@ -237,6 +878,9 @@ class MemoryEngine:
         try:
             safe_conv_id = sanitize_conversation_id(conversation_id)
             count = self.db.delete_conversation(safe_conv_id)
+            self._invalidate_caches([safe_conv_id])
+            # Deletes can move the date range, so recount on the next call
+            self._stats = None
             
             logger.info(f"Cleared conversation {safe_conv_id}: {count} messages deleted")
             return count
@@ -253,7 +897,12 @@ class MemoryEngine:
             Dictionary with statistics about stored memories
         """
         try:
-            stats = self.db.get_statistics()
+            if self._stats is None or time.monotonic() - self._stats_loaded_at > self.STATS_TTL:
+                self._stats = self.db.get_statistics()
+                self._stats_conversations = set(self.db.get_conversation_ids())
+                self._stats_loaded_at = time.monotonic()
+                
+            stats = dict(self._stats)
             stats['database_path'] = self.db_path
             stats['embedding_model'] = self.embedding_model
             
@@ -264,6 +913,21 @@ class MemoryEngine:
             logger.error(f"Error getting statistics: {e}")
             raise
             
+    def _record_saved(self, conversation_ids: List[str], messages: int, embeddings: int) -> None:
+        """Fold rows this engine just wrote into the cached statistics."""
+        if self._stats is None:
+            return
+            
+        self._stats_conversations.update(conversation_ids)
+        self._stats['total_conversations'] = len(self._stats_conversations)
+        self._stats['total_messages'] += messages
+        self._stats['total_embeddings'] += embeddings
+        if messages:
+            # Same UTC format as SQLite's CURRENT_TIMESTAMP
+            now = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            self._stats['first_message'] = self._stats['first_message'] or now
+            self._stats['last_message'] = now
+            
     def search_by_keyword(
         self,
         keyword: str,
@@ -271,32 +935,19 @@ class MemoryEngine:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """
-        Simple keyword-based search (non-semantic).
+        Keyword-based search (non-semantic), ranked by BM25.
         
         Args:
             keyword: Keyword to search for
-            conversation_id: Optional conversation filter
+            conversation_id: Conversation to search ("default" if None)
             limit: Maximum number of results
             
         Returns:
             List of matching messages
         """
         try:
-            # Get conversation history
-            messages = self.get_conversation_history(
-                conversation_id or "default",
-                limit=1000  # Get more to search through
-            )
-            
-            # Filter by keyword
-            keyword_lower = keyword.lower()
-            matches = [
-                msg for msg in messages
-                if keyword_lower in msg['content'].lower()
-            ]
-            
-            # Limit results
-            results = matches[:limit]
+            safe_conv_id = sanitize_conversation_id(conversation_id or "default")
+            results = self.db.search_keyword(keyword, safe_conv_id, limit)
             
             logger.info(f"Keyword search for '{keyword}': {len(results)} matches")
             return results
@@ -311,6 +962,11 @@ class MemoryEngine:
             self.db.close()
             logger.info("MemoryEngine closed")
             
+    async def aclose(self) -> None:
+        """Close the async embeddings client and the database (after async use)."""
+        await self.embeddings.aclose()
+        self.close()
+        
     def __enter__(self):
         """Context manager entry."""
         return self
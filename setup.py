@@ -30,6 +30,14 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        "simd": ["simsimd>=3.0"],
+        "vec": ["sqlite-vec>=0.1.6"],
+        "jit": ["numba>=0.57"],
+        "fast-json": ["orjson>=3.0"],
+        "ann": ["hnswlib>=0.7"],
+        "tokens": ["tiktoken>=0.5"],
+    },
     entry_points={
         "console_scripts": [
             "mini-memori-chat=mini_memori.chatbot:main",
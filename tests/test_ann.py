@@ -0,0 +1,115 @@
+"""
+Unit tests for Mini Memori HNSW index.
+"""
+
+import unittest
+import os
+import tempfile
+import numpy as np
+from unittest.mock import patch
+from mini_memori import ann
+from mini_memori.database import Database
+
+
+@unittest.skipIf(ann.hnswlib is None, "hnswlib not installed")
+class TestHNSWIndex(unittest.TestCase):
+    """Test cases for HNSWIndex class."""
+    
+    def test_search(self):
+        """Test nearest neighbour search with and without a filter."""
+        index = ann.HNSWIndex()
+        index.add([1, 2, 3], np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]))
+        
+        hits = index.search(np.array([1.0, 0.0]), k=2)
+        self.assertEqual([message_id for message_id, _ in hits], [1, 3])
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertAlmostEqual(hits[1][1], np.sqrt(0.5), places=5)
+        
+        hits = index.search(np.array([1.0, 0.0]), k=5, allowed={2, 99})
+        self.assertEqual([message_id for message_id, _ in hits], [2])
+        
+        # Other dimensions can't be served
+        self.assertIsNone(index.search(np.array([1.0, 0.0, 0.0]), k=1))
+        
+    def test_remove_and_resize(self):
+        """Test deleting vectors and growing past the initial capacity."""
+        index = ann.HNSWIndex()
+        count = index.INITIAL_CAPACITY + 10
+        vectors = np.random.default_rng(0).normal(size=(count, 8))
+        index.add(list(range(count)), vectors)
+        self.assertEqual(len(index), count)
+        
+        index.remove([0, 1, 12345])
+        self.assertEqual(len(index), count - 2)
+        hits = index.search(vectors[0], k=3)
+        self.assertNotIn(0, [message_id for message_id, _ in hits])
+        
+    def test_save_and_load(self):
+        """Test persisting the index to disk."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.hnsw")
+            index = ann.HNSWIndex(path)
+            index.add([7, 8], np.array([[1.0, 0.0], [0.0, 1.0]]))
+            index.save()
+            
+            loaded = ann.HNSWIndex(path)
+            self.assertEqual(loaded.load(2), {7, 8})
+            self.assertEqual(loaded.search(np.array([0.0, 1.0]), k=1)[0][0], 8)
+            
+            # A file of another dimension is discarded
+            self.assertEqual(ann.HNSWIndex(path).load(3), set())
+
+
+@unittest.skipIf(ann.hnswlib is None, "hnswlib not installed")
+class TestDatabaseHNSW(unittest.TestCase):
+    """Test cases for the HNSW index behind Database.search_embeddings."""
+    
+    def setUp(self):
+        """Set up a test database without sqlite-vec."""
+        # The directory takes the WAL and index sidecar files with it
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp.name, "test.db")
+        self.patcher = patch('mini_memori.database.sqlite_vec', None)
+        self.patcher.start()
+        self.db = Database(self.db_path)
+        
+    def tearDown(self):
+        """Clean up after each test."""
+        self.db.close()
+        self.patcher.stop()
+        self._tmp.cleanup()
+        
+    def test_index_follows_database(self):
+        """Test that saves and deletes keep the index in sync across reopens."""
+        message_ids = self.db.save_messages(
+            [("conv_a", "user", "a", None), ("conv_b", "user", "b", None)],
+            embeddings=[[1.0, 0.0], [0.0, 1.0]],
+            model="test-model"
+        )
+        self.assertIsNotNone(self.db.ann)
+        
+        results = self.db.search_embeddings([1.0, 0.0], top_k=2)
+        self.assertEqual([message_id for message_id, _, _ in results], message_ids)
+        
+        results = self.db.search_embeddings([1.0, 0.0], top_k=2, conversation_id="conv_b")
+        self.assertEqual([data['content'] for _, _, data in results], ["b"])
+        
+        self.db.delete_conversation("conv_a")
+        self.db.close()
+        self.assertTrue(os.path.exists(self.db_path + ".hnsw"))
+        
+        # A write made while the index file is stale is picked up on reopen
+        self.db = Database(self.db_path)
+        message_id = self.db.save_message("conv_c", "user", "c")
+        self.db.save_embedding(message_id, [0.6, 0.8], "test-model")
+        self.db.ann = None
+        self.db.close()
+        
+        self.db = Database(self.db_path)
+        self.assertEqual(len(self.db.ann), 2)
+        results = self.db.search_embeddings([1.0, 0.0], top_k=5)
+        self.assertEqual([data['content'] for _, _, data in results], ["c", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Unit tests for Mini Memori caches.
+"""
+
+import unittest
+from mini_memori.cache import LRUCache, SemanticCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """Test cases for LRUCache."""
+    
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest unused entry is evicted."""
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        
+    def test_disabled(self):
+        """Test that a size of 0 stores nothing."""
+        cache = LRUCache(max_size=0)
+        cache.put("a", 1)
+        self.assertEqual(len(cache), 0)
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Test cases for SemanticCache."""
+    
+    def test_similar_query_hits(self):
+        """Test lookup by embedding similarity and key."""
+        cache = SemanticCache(max_size=4, threshold=0.95)
+        cache.put([1.0, 0.0], ("k",), "x")
+        
+        self.assertEqual(cache.get([1.0, 0.01], ("k",)), "x")
+        self.assertIsNone(cache.get([0.0, 1.0], ("k",)))
+        self.assertIsNone(cache.get([1.0, 0.0], ("other",)))
+        
+    def test_evicts_least_frequently_used(self):
+        """Test that the least used entry is evicted first."""
+        cache = SemanticCache(max_size=2, threshold=0.99)
+        cache.put([1.0, 0.0], None, "a")
+        cache.put([0.0, 1.0], None, "b")
+        cache.get([1.0, 0.0])
+        cache.put([1.0, 1.0], None, "c")
+        
+        self.assertEqual(cache.get([1.0, 0.0]), "a")
+        self.assertIsNone(cache.get([0.0, 1.0]))
+        self.assertEqual(len(cache), 2)
+        
+    def test_clear(self):
+        """Test clearing the cache."""
+        cache = SemanticCache()
+        cache.put([1.0, 0.0], None, "a")
+        cache.clear()
+        self.assertIsNone(cache.get([1.0, 0.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
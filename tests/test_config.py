@@ -0,0 +1,46 @@
+"""
+Unit tests for Mini Memori config module.
+"""
+
+import os
+import tempfile
+import unittest
+from dataclasses import FrozenInstanceError
+from unittest.mock import patch
+from mini_memori.config import Config
+
+
+class TestConfig(unittest.TestCase):
+    """Test cases for Config class."""
+    
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}, clear=True)
+    def test_reads_environment(self):
+        """Test Config() reads the environment."""
+        config = Config()
+        self.assertEqual(config.openai_api_key, "sk-test")
+        self.assertEqual(config.db_path, "memories.db")
+        self.assertIsNone(config.dedup_threshold)
+        
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}, clear=True)
+    def test_env_file_argument(self):
+        """Test Config(env_file) loads the given .env file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            env_file = os.path.join(tmp, ".env")
+            with open(env_file, "w") as f:
+                f.write("DB_PATH=other.db\nDEDUP_THRESHOLD=0.9\n")
+            config = Config(env_file)
+        self.assertEqual(config.openai_api_key, "sk-test")
+        self.assertEqual(config.db_path, "other.db")
+        self.assertEqual(config.dedup_threshold, 0.9)
+        self.assertEqual(Config.from_env(env_file), config)
+        
+    @patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}, clear=True)
+    def test_immutable(self):
+        """Test config values cannot be reassigned."""
+        config = Config()
+        with self.assertRaises(FrozenInstanceError):
+            config.db_path = "other.db"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,51 +4,106 @@ Unit tests for Mini Memori database module.
 
 import unittest
 import os
+import json
 import tempfile
-from mini_memori.database import Database
+from contextlib import ExitStack
+import numpy as np
+import sqlite3
+from unittest.mock import patch
+from mini_memori.ann import HNSWIndex
+from mini_memori.database import (
+    Database, encode_embedding, decode_embedding, quantize_embedding,
+    encode_metadata, decode_metadata
+)
 
 
 class TestDatabase(unittest.TestCase):
     """Test cases for Database class."""
     
+    @classmethod
+    def setUpClass(cls):
+        """Create the schema once, in memory, for every test in the class."""
+        # Durability doesn't matter here, so skip journaling and syncs
+        cls.shared_db = Database(":memory:", journal_mode="memory", synchronous="off")
+        
+    @classmethod
+    def tearDownClass(cls):
+        """Close the shared database."""
+        cls.shared_db.close()
+        
     def setUp(self):
-        """Set up test database before each test."""
-        # Create temporary database
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-        self.temp_db.close()
-        self.db = Database(self.temp_db.name)
+        """Open a transaction on the shared database for the test to write in."""
+        self.db = self.shared_db
+        
+        # Inside a batch the database doesn't commit, so the test's writes
+        # stay after the savepoint until tearDown discards them
+        self._transaction = ExitStack()
+        self._transaction.enter_context(self.db.batch())
+        self.db.conn.execute("SAVEPOINT test")
         
     def tearDown(self):
-        """Clean up after each test."""
-        self.db.close()
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
+        """Roll back the test's writes."""
+        # A full rollback also covers tests whose errors already rolled back
+        # past the savepoint
+        self.db.conn.rollback()
+        self._transaction.close()
+        
+        # KNN index state kept in Python doesn't roll back with SQLite
+        self.db._vec_dim = None
+        if self.db.ann is not None:
+            self.db.ann = HNSWIndex(None)
             
+    def _file_path(self) -> str:
+        """Return a database path in a temporary directory removed after the test."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return os.path.join(tmp_dir.name, "test.db")
+        
     def test_schema_creation(self):
         """Test that database schema is created correctly."""
-        cursor = self.db.conn.cursor()
-        
-        # Check messages table exists
-        cursor.execute("""
+        # Check the messages, embeddings and conversations tables exist
+        rows = self.db.conn.execute("""
             SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='messages'
-        """)
-        self.assertIsNotNone(cursor.fetchone())
+            WHERE type='table' AND name IN ('messages', 'embeddings', 'conversations')
+        """).fetchall()
+        self.assertEqual({row[0] for row in rows}, {'messages', 'embeddings', 'conversations'})
         
-        # Check embeddings table exists
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='embeddings'
-        """)
-        self.assertIsNotNone(cursor.fetchone())
+    def test_schema_version(self):
+        """Test that reopening a current database skips the schema DDL."""
+        db_path = self._file_path()
+        with Database(db_path) as db:
+            version = db.conn.execute("PRAGMA user_version").fetchone()[0]
+            self.assertEqual(version, Database.SCHEMA_VERSION)
+            
+        with patch.object(Database, '_create_tables') as create_tables:
+            with Database(db_path) as db:
+                self.assertEqual(db.fts_enabled, self.db.fts_enabled)
+                db.save_message("test_conv", "user", "Reopened")
+        create_tables.assert_not_called()
         
-        # Check conversations table exists
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='conversations'
-        """)
-        self.assertIsNotNone(cursor.fetchone())
+    def test_connection_pragmas(self):
+        """Test that performance PRAGMAs are applied on connect."""
+        # WAL needs a database file
+        with Database(self._file_path()) as db:
+            journal_mode = db.conn.execute("PRAGMA journal_mode").fetchone()[0]
+            synchronous = db.conn.execute("PRAGMA synchronous").fetchone()[0]
+            temp_store = db.conn.execute("PRAGMA temp_store").fetchone()[0]
+        
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(temp_store, 2)  # MEMORY
         
+    def test_pragma_overrides(self):
+        """Test overriding journal mode and synchronous level."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "rollback.db")
+            with Database(db_path, journal_mode="delete", synchronous="full") as db:
+                self.assertEqual(db.conn.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+                self.assertEqual(db.conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+                
+        with self.assertRaises(ValueError):
+            Database(":memory:", synchronous="sometimes")
+            
     def test_save_message(self):
         """Test saving a message."""
         message_id = self.db.save_message(
@@ -75,6 +130,96 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(len(history), 1)
         self.assertEqual(history[0]['metadata'], metadata)
         
+    def test_metadata_serialization(self):
+        """Test metadata round trips with and without orjson."""
+        metadata = {"source": "café", "tags": ["a", "b"], 1: 2.5}
+        expected = {"source": "café", "tags": ["a", "b"], "1": 2.5}
+        
+        self.assertEqual(decode_metadata(encode_metadata(metadata)), expected)
+        self.assertIsNone(encode_metadata({}))
+        self.assertIsNone(decode_metadata(None))
+        
+        with patch('mini_memori.database.orjson', None):
+            self.assertEqual(decode_metadata(encode_metadata(metadata)), expected)
+            
+    def test_save_messages(self):
+        """Test saving several messages and embeddings in one transaction."""
+        message_ids = self.db.save_messages(
+            [
+                ("test_conv", "user", "Message 0", None),
+                ("test_conv", "assistant", "Message 1", {"key": "value"}),
+                ("other_conv", "user", "Message 2", None),
+            ],
+            embeddings=[[0.1] * 5, None, [0.3] * 5],
+            model="test-model"
+        )
+        
+        self.assertEqual(len(message_ids), 3)
+        self.assertEqual(message_ids, sorted(message_ids))
+        
+        history = self.db.get_conversation_history("test_conv")
+        self.assertEqual([m['id'] for m in history], message_ids[:2])
+        self.assertEqual(history[1]['metadata'], {"key": "value"})
+        
+        # Only non-None embeddings are stored, linked to the right messages
+        embedded_ids = sorted(msg_id for msg_id, _, _ in self.db.get_all_embeddings())
+        self.assertEqual(embedded_ids, [message_ids[0], message_ids[2]])
+        
+    def test_save_messages_empty(self):
+        """Test saving an empty batch."""
+        self.assertEqual(self.db.save_messages([]), [])
+        
+    def test_batch(self):
+        """Test grouping writes into one transaction."""
+        # Visibility to other connections needs a database file
+        db_path = self._file_path()
+        db = Database(db_path)
+        self.addCleanup(db.close)
+        reader = sqlite3.connect(db_path)
+        try:
+            with db.batch():
+                message_id = db.save_message("test_conv", "user", "Batched")
+                db.save_embedding(message_id, [0.1, 0.2], "test-model")
+                with db.batch():
+                    db.save_messages([("test_conv", "user", "Nested", None)])
+                    
+                # Nothing is visible to other connections until the block exits
+                self.assertTrue(db.conn.in_transaction)
+                self.assertEqual(reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0], 0)
+                
+            self.assertFalse(db.conn.in_transaction)
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0], 2)
+            
+            # An exception rolls the whole batch back
+            with self.assertRaises(RuntimeError):
+                with db.batch():
+                    db.save_message("test_conv", "user", "Lost")
+                    raise RuntimeError("boom")
+            self.assertEqual(len(db.get_conversation_history("test_conv")), 2)
+        finally:
+            reader.close()
+            
+    def test_read_connections(self):
+        """Test serving reads from a pool of read-only connections."""
+        db = Database(self._file_path(), read_connections=2)
+        self.addCleanup(db.close)
+        db.save_message("test_conv", "user", "Committed")
+        
+        with db._reader() as conn:
+            self.assertIsNot(conn, db.conn)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM messages")
+                
+        # Inside a batch, reads go to the writer and see its pending writes
+        with db.batch():
+            db.save_message("test_conv", "user", "Pending")
+            history = db.get_conversation_history("test_conv")
+            self.assertEqual([m['content'] for m in history], ["Committed", "Pending"])
+            
+        # No pool for in-memory databases
+        with Database(":memory:", read_connections=2) as memory_db:
+            self.assertIsNone(memory_db._readers)
+            
     def test_save_embedding(self):
         """Test saving an embedding."""
         # First save a message
@@ -95,21 +240,212 @@ class TestDatabase(unittest.TestCase):
         self.assertIsInstance(embedding_id, int)
         self.assertGreater(embedding_id, 0)
         
+    def test_save_embeddings(self):
+        """Test saving embeddings for existing messages in one batch."""
+        message_ids = self.db.save_messages([
+            ("conv_a", "user", "First", None),
+            ("conv_b", "user", "Second", None),
+        ])
+        
+        count = self.db.save_embeddings(
+            ((message_id, [float(i), 1.0]) for i, message_id in enumerate(message_ids)),
+            "test-model"
+        )
+        self.assertEqual(count, 2)
+        
+        # Streamed back lazily, optionally per conversation
+        stream = self.db.iter_embeddings(conversation_id="conv_b")
+        self.assertNotIsInstance(stream, list)
+        (message_id, embedding, data), = list(stream)
+        self.assertEqual(message_id, message_ids[1])
+        np.testing.assert_array_equal(embedding, [1.0, 1.0])
+        self.assertEqual(data['embedding_model'], "test-model")
+        self.assertEqual(len(list(self.db.iter_embeddings())), 2)
+        
+    def test_iter_embedding_batches(self):
+        """Test streaming unit-norm embedding batches, newest first."""
+        message_ids = self.db.save_messages([
+            ("conv_a", "user", f"Message {i}", None) for i in range(5)
+        ])
+        self.db.save_embeddings(((message_id, [3.0, 4.0]) for message_id in message_ids), "m")
+        self.db.save_embeddings([(message_ids[0], [1.0, 0.0, 0.0])], "m")
+        
+        batches = list(self.db.iter_embedding_batches(2, batch_size=2))
+        self.assertEqual([len(messages) for _, messages in batches], [2, 2, 1])
+        self.assertEqual(
+            [m['id'] for _, messages in batches for m in messages], message_ids[::-1]
+        )
+        np.testing.assert_allclose(batches[0][0], [[0.6, 0.8], [0.6, 0.8]], atol=1e-6)
+        self.assertEqual(list(self.db.iter_embedding_batches(2, conversation_id="other")), [])
+        
+    def test_conversation_rows(self):
+        """Test that inserting messages creates and touches conversation rows."""
+        self.db.save_message("conv_a", "user", "First")
+        self.db.conn.execute(
+            "UPDATE conversations SET updated_at = '2000-01-01 00:00:00' WHERE id = 'conv_a'"
+        )
+        self.db.save_messages([("conv_a", "user", "Second", None), ("conv_b", "user", "Third", None)])
+        
+        rows = self.db.conn.execute(
+            "SELECT id, created_at, updated_at FROM conversations ORDER BY id"
+        ).fetchall()
+        self.assertEqual([row['id'] for row in rows], ["conv_a", "conv_b"])
+        self.assertNotEqual(rows[0]['updated_at'], '2000-01-01 00:00:00')
+        
+    def test_embedding_stored_as_float32(self):
+        """Test that embeddings are stored as packed float32 bytes."""
+        message_id = self.db.save_message(
+            conversation_id="test_conv",
+            role="user",
+            content="Test message"
+        )
+        self.db.save_embedding(
+            message_id=message_id,
+            embedding=[0.1, 0.2, 0.3, 0.4, 0.5],
+            model="test-model"
+        )
+        
+        blob = self.db.conn.execute("SELECT embedding FROM embeddings").fetchone()[0]
+        self.assertEqual(len(blob), 5 * 4)
+        np.testing.assert_allclose(decode_embedding(blob), [0.1, 0.2, 0.3, 0.4, 0.5], rtol=1e-6)
+        
+    def test_decode_legacy_json_embedding(self):
+        """Test reading embeddings written as JSON by earlier versions."""
+        legacy = json.dumps([0.1, 0.2, 0.3]).encode('utf-8')
+        np.testing.assert_allclose(decode_embedding(legacy), [0.1, 0.2, 0.3], rtol=1e-6)
+        
+        # Packed floats that merely start with '[' and end with ']' are not JSON
+        packed = encode_embedding(np.frombuffer(b'[\x00\x00\x00\x00\x00\x00]', dtype='<f4'))
+        self.assertEqual(decode_embedding(packed).tobytes(), packed)
+        
+    def test_quantized_embeddings(self):
+        """Test storing embeddings as int8 with a per-vector scale."""
+        embedding = np.random.default_rng(0).normal(size=64).astype(np.float32)
+        
+        blob = quantize_embedding(embedding)
+        self.assertEqual(len(blob), 4 + 64)
+        np.testing.assert_allclose(
+            decode_embedding(blob, quantized=True), embedding,
+            atol=np.abs(embedding).max() / 127
+        )
+        
+        self.db.quantize = True
+        message_id = self.db.save_message("test_conv", "user", "Quantized")
+        self.db.save_embedding(message_id, embedding, "test-model")
+        self.db.quantize = False
+        message_id = self.db.save_message("test_conv", "user", "Full precision")
+        self.db.save_embedding(message_id, embedding, "test-model")
+        
+        stored = {data['content']: vec for _, vec, data in self.db.get_all_embeddings()}
+        np.testing.assert_allclose(stored["Quantized"], embedding, atol=np.abs(embedding).max() / 127)
+        np.testing.assert_allclose(stored["Full precision"], embedding, rtol=1e-6)
+        
+        # Both formats load as the same int8 codes
+        codes, messages = self.db.load_embedding_codes(64)
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(len(messages), 2)
+        np.testing.assert_array_equal(codes[0], codes[1])
+        np.testing.assert_array_equal(codes[0], np.frombuffer(blob, dtype=np.int8, offset=4))
+        
+    def test_migrates_legacy_embeddings(self):
+        """Test that old databases get format columns and float32 vectors."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "old.db")
+            conn = sqlite3.connect(path)
+            conn.execute("""
+                CREATE TABLE embeddings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id INTEGER NOT NULL,
+                    embedding BLOB NOT NULL,
+                    model TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute(
+                "INSERT INTO embeddings (message_id, embedding, model) VALUES (1, ?, 'm')",
+                (json.dumps([0.5, 0.25, 1.0]).encode('utf-8'),)
+            )
+            conn.commit()
+            conn.close()
+            
+            with Database(path) as db:
+                columns = [row['name'] for row in db.conn.execute("PRAGMA table_info(embeddings)")]
+                self.assertIn('quantized', columns)
+                self.assertIn('dim', columns)
+                
+                row = db.conn.execute("SELECT embedding, dim FROM embeddings").fetchone()
+                self.assertEqual(row['embedding'], encode_embedding([0.5, 0.25, 1.0]))
+                self.assertEqual(row['dim'], 3)
+                
+    def test_migrates_legacy_messages(self):
+        """Test that old databases lose created_at and the timestamp indexes."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "old.db")
+            conn = sqlite3.connect(path)
+            conn.executescript("""
+                CREATE TABLE messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    metadata TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX idx_messages_conversation ON messages(conversation_id, timestamp);
+                CREATE INDEX idx_messages_timestamp ON messages(timestamp);
+                INSERT INTO messages (conversation_id, role, content) VALUES ('c', 'user', 'old');
+            """)
+            conn.commit()
+            conn.close()
+            
+            with Database(path) as db:
+                columns = [row['name'] for row in db.conn.execute("PRAGMA table_info(messages)")]
+                self.assertNotIn('created_at', columns)
+                
+                indexes = [row['name'] for row in db.conn.execute("PRAGMA index_list(messages)")]
+                self.assertNotIn('idx_messages_timestamp', indexes)
+                columns = [
+                    row['name'] for row in db.conn.execute("PRAGMA index_info(idx_messages_conversation)")
+                ]
+                self.assertEqual(columns, ['conversation_id'])
+                
+                db.save_message("c", "user", "new")
+                
+            with Database(path) as db:
+                history = db.get_conversation_history("c")
+                self.assertEqual([m['content'] for m in history], ["old", "new"])
+                
+    def test_load_embedding_matrix(self):
+        """Test loading embeddings into one matrix."""
+        rows = [("a", [3.0, 4.0]), ("b", [0.0, 1.0]), ("a", [1.0, 2.0, 3.0])]
+        self.db.save_messages(
+            [(conv_id, "user", f"{conv_id} {len(embedding)}", None) for conv_id, embedding in rows],
+            embeddings=[embedding for _, embedding in rows],
+            model="test-model"
+        )
+        
+        matrix, messages = self.db.load_embedding_matrix(2)
+        self.assertEqual(matrix.shape, (2, 2))
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertEqual(len(messages), 2)
+        
+        # Rows come back unit length
+        np.testing.assert_allclose(sorted(matrix.tolist()), [[0.0, 1.0], [0.6, 0.8]], atol=1e-6)
+        
+        matrix, messages = self.db.load_embedding_matrix(2, conversation_id="b")
+        np.testing.assert_array_equal(matrix, [[0.0, 1.0]])
+        self.assertEqual(messages[0]['content'], "b 2")
+        
     def test_get_all_embeddings(self):
         """Test retrieving all embeddings."""
         # Save messages with embeddings
-        for i in range(3):
-            message_id = self.db.save_message(
-                conversation_id="test_conv",
-                role="user",
-                content=f"Message {i}"
-            )
-            self.db.save_embedding(
-                message_id=message_id,
-                embedding=[float(i)] * 5,
-                model="test-model"
-            )
-            
+        self.db.save_messages(
+            [("test_conv", "user", f"Message {i}", None) for i in range(3)],
+            embeddings=[[float(i)] * 5 for i in range(3)],
+            model="test-model"
+        )
+        
         # Retrieve all
         embeddings = self.db.get_all_embeddings()
         self.assertEqual(len(embeddings), 3)
@@ -117,9 +453,118 @@ class TestDatabase(unittest.TestCase):
         # Check structure
         msg_id, embedding_vec, data = embeddings[0]
         self.assertIsInstance(msg_id, int)
-        self.assertIsInstance(embedding_vec, list)
+        self.assertIsInstance(embedding_vec, np.ndarray)
+        self.assertEqual(embedding_vec.dtype, np.float32)
         self.assertIsInstance(data, dict)
         
+        # Filter by conversation
+        message_id = self.db.save_message("other_conv", "user", "Elsewhere")
+        self.db.save_embedding(message_id, [1.0] * 5, "test-model")
+        embeddings = self.db.get_all_embeddings(conversation_id="other_conv")
+        self.assertEqual([data['content'] for _, _, data in embeddings], ["Elsewhere"])
+        
+    def test_get_message_embeddings(self):
+        """Test looking up the latest embedding of some messages."""
+        first, second, third = self.db.save_messages(
+            [("test_conv", "user", f"Message {i}", None) for i in range(3)],
+            embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+            model="test-model"
+        )
+        self.db.save_embedding(first, [0.6, 0.8], "test-model")
+        self.db.save_embedding(second, [1.0, 0.0, 0.0], "other-model")
+        
+        embeddings = self.db.get_message_embeddings([first, second, 999], 2)
+        self.assertEqual(sorted(embeddings), [first, second])
+        np.testing.assert_allclose(embeddings[first], [0.6, 0.8])
+        np.testing.assert_allclose(embeddings[second], [0.0, 1.0])
+        self.assertEqual(self.db.get_message_embeddings([], 2), {})
+        
+    def test_embedding_cache(self):
+        """Test storing and looking up embeddings by content hash."""
+        self.db.cache_embeddings([(b"a" * 16, [0.5, 0.25]), (b"b" * 16, [1.0, 0.0])], "model-1")
+        
+        cached = self.db.get_cached_embeddings([b"a" * 16, b"c" * 16], "model-1")
+        self.assertEqual(list(cached), [b"a" * 16])
+        np.testing.assert_array_equal(cached[b"a" * 16], [0.5, 0.25])
+        
+        # Entries are per model
+        self.assertEqual(self.db.get_cached_embeddings([b"a" * 16], "model-2"), {})
+        
+    def test_search_embeddings(self):
+        """Test KNN search through the sqlite-vec or HNSW index."""
+        vectors = {
+            "conv_a": [[1.0, 0.0, 0.0], [0.9, 0.1, 0.0]],
+            "conv_b": [[0.0, 1.0, 0.0]],
+        }
+        rows = [
+            (conv_id, i, embedding)
+            for conv_id, embeddings in vectors.items()
+            for i, embedding in enumerate(embeddings)
+        ]
+        self.db.save_messages(
+            [(conv_id, "user", f"{conv_id} {i}", None) for conv_id, i, _ in rows],
+            embeddings=[embedding for _, _, embedding in rows],
+            model="test-model"
+        )
+        
+        results = self.db.search_embeddings([1.0, 0.0, 0.0], top_k=2)
+        if not self.db.vec_enabled and self.db.ann is None:
+            self.assertIsNone(results)
+            self.skipTest("No KNN index available")
+            
+        self.assertEqual([data['content'] for _, _, data in results], ["conv_a 0", "conv_a 1"])
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        
+        # Filter by conversation
+        results = self.db.search_embeddings([1.0, 0.0, 0.0], top_k=5, conversation_id="conv_b")
+        self.assertEqual([data['content'] for _, _, data in results], ["conv_b 0"])
+        
+        # Deleted conversations leave the index
+        self.db.delete_conversation("conv_a")
+        results = self.db.search_embeddings([1.0, 0.0, 0.0], top_k=5)
+        self.assertEqual([data['content'] for _, _, data in results], ["conv_b 0"])
+        
+    def test_search_keyword(self):
+        """Test case-insensitive substring keyword search."""
+        self.db.save_message("conv_a", "user", "I love Python programming")
+        self.db.save_message("conv_a", "user", "100% sure")
+        self.db.save_message("conv_b", "user", "python and pythons")
+        
+        results = self.db.search_keyword("PYTHON")
+        self.assertEqual(len(results), 2)
+        # The message mentioning the keyword most often ranks first with FTS5
+        if self.db.fts_enabled:
+            self.assertEqual(results[0]['content'], "python and pythons")
+            
+        results = self.db.search_keyword("python", conversation_id="conv_a")
+        self.assertEqual([msg['content'] for msg in results], ["I love Python programming"])
+        
+        # Short keywords and LIKE wildcards fall back to an escaped scan
+        self.assertEqual(len(self.db.search_keyword("%")), 1)
+        self.assertEqual(len(self.db.search_keyword("py")), 2)
+        
+        # Deleted messages leave the index
+        self.db.delete_conversation("conv_b")
+        self.assertEqual(len(self.db.search_keyword("python")), 1)
+        
+    def test_search_text(self):
+        """Test BM25 ranking over any of several terms."""
+        self.db.save_message("conv", "user", "I enjoy hiking in the mountains")
+        self.db.save_message("conv", "user", "Python is my favorite language")
+        self.db.save_message("conv", "user", "My favorite food is pizza")
+        
+        results = self.db.search_text(["favorite", "pizza", "a"])
+        if not self.db.fts_enabled:
+            self.assertIsNone(results)
+            self.skipTest("FTS5 not available")
+            
+        self.assertEqual(
+            [data['content'] for _, _, data in results],
+            ["My favorite food is pizza", "Python is my favorite language"]
+        )
+        self.assertGreater(results[0][1], results[1][1])
+        self.assertEqual(self.db.search_text(["a"]), [])
+        
     def test_get_conversation_history(self):
         """Test retrieving conversation history."""
         # Save multiple messages
@@ -139,30 +584,50 @@ class TestDatabase(unittest.TestCase):
         for i, msg_dict in enumerate(history):
             self.assertEqual(msg_dict['content'], messages[i])
             
+    def test_get_conversation_history_paging(self):
+        """Test paging forward through a long conversation by message ID."""
+        self.db.save_messages([
+            ("test_conv", "user", f"Message {i}", None) for i in range(1000)
+        ])
+        
+        contents = []
+        page = self.db.get_conversation_history("test_conv", limit=64, after_id=0)
+        while page:
+            contents.extend(m['content'] for m in page)
+            page = self.db.get_conversation_history("test_conv", limit=64, after_id=page[-1]['id'])
+            
+        self.assertEqual(contents, [f"Message {i}" for i in range(1000)])
+        
+        # Both bounds select the messages between two IDs
+        ids = [m['id'] for m in self.db.get_conversation_history("test_conv", limit=None)]
+        between = self.db.get_conversation_history(
+            "test_conv", limit=None, before_id=ids[5], after_id=ids[1]
+        )
+        self.assertEqual([m['id'] for m in between], ids[2:5])
+        
     def test_get_conversation_history_with_limit(self):
         """Test conversation history with limit."""
         # Save 10 messages
-        for i in range(10):
-            self.db.save_message(
-                conversation_id="test_conv",
-                role="user",
-                content=f"Message {i}"
-            )
-            
-        # Retrieve with limit
+        self.db.save_messages([
+            ("test_conv", "user", f"Message {i}", None) for i in range(10)
+        ])
+        
+        # Retrieve with limit: the most recent messages, oldest first
         history = self.db.get_conversation_history("test_conv", limit=5)
-        self.assertEqual(len(history), 5)
+        self.assertEqual([m['content'] for m in history], [f"Message {i}" for i in range(5, 10)])
+        
+        # Page back from the oldest message returned
+        older = self.db.get_conversation_history("test_conv", limit=3, before_id=history[0]['id'])
+        self.assertEqual([m['content'] for m in older], ["Message 2", "Message 3", "Message 4"])
+        self.assertEqual(len(self.db.get_conversation_history("test_conv", limit=None)), 10)
         
     def test_delete_conversation(self):
         """Test deleting a conversation."""
         # Save messages
-        for i in range(3):
-            self.db.save_message(
-                conversation_id="test_conv",
-                role="user",
-                content=f"Message {i}"
-            )
-            
+        self.db.save_messages([
+            ("test_conv", "user", f"Message {i}", None) for i in range(3)
+        ])
+        
         # Delete conversation
         deleted_count = self.db.delete_conversation("test_conv")
         self.assertEqual(deleted_count, 3)
@@ -174,18 +639,12 @@ class TestDatabase(unittest.TestCase):
     def test_get_statistics(self):
         """Test getting database statistics."""
         # Add some data
-        for i in range(5):
-            message_id = self.db.save_message(
-                conversation_id=f"conv_{i % 2}",
-                role="user",
-                content=f"Message {i}"
-            )
-            self.db.save_embedding(
-                message_id=message_id,
-                embedding=[float(i)] * 5,
-                model="test-model"
-            )
-            
+        self.db.save_messages(
+            [(f"conv_{i % 2}", "user", f"Message {i}", None) for i in range(5)],
+            embeddings=[[float(i)] * 5 for i in range(5)],
+            model="test-model"
+        )
+        
         # Get statistics
         stats = self.db.get_statistics()
         
@@ -197,7 +656,7 @@ class TestDatabase(unittest.TestCase):
         
     def test_context_manager(self):
         """Test using database as context manager."""
-        with Database(self.temp_db.name) as db:
+        with Database(self._file_path()) as db:
             message_id = db.save_message(
                 conversation_id="test_conv",
                 role="user",
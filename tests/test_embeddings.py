@@ -3,7 +3,9 @@ Unit tests for Mini Memori embeddings module.
 """
 
 import unittest
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+import numpy as np
 from mini_memori.embeddings import EmbeddingService
 
 
@@ -29,8 +31,8 @@ class TestEmbeddingService(unittest.TestCase):
         # Generate embedding
         result = self.service.generate_embedding("test text")
         
-        # Verify
-        self.assertEqual(result, [0.1, 0.2, 0.3])
+        # Verify (returned at unit length)
+        np.testing.assert_allclose(result, np.array([1, 2, 3]) / np.sqrt(14), rtol=1e-6)
         mock_create.assert_called_once()
         
     @patch('mini_memori.embeddings.openai.embeddings.create')
@@ -47,6 +49,9 @@ class TestEmbeddingService(unittest.TestCase):
         call_args = mock_create.call_args
         self.assertNotIn("\n", call_args[1]['input'])
         
+        self.service.generate_embedding("  tabs\tand\r\nbreaks \n")
+        self.assertEqual(mock_create.call_args[1]['input'], "tabs and  breaks")
+        
     def test_generate_embedding_empty_text(self):
         """Test that empty text raises error."""
         with self.assertRaises(ValueError):
@@ -68,9 +73,73 @@ class TestEmbeddingService(unittest.TestCase):
         
         # Verify
         self.assertEqual(len(results), 2)
-        self.assertEqual(results[0], [0.1, 0.2, 0.3])
-        self.assertEqual(results[1], [0.4, 0.5, 0.6])
+        np.testing.assert_allclose(results[0], np.array([1, 2, 3]) / np.sqrt(14), rtol=1e-6)
+        np.testing.assert_allclose(results[1], np.array([4, 5, 6]) / np.sqrt(77), rtol=1e-6)
         
+    @patch('mini_memori.embeddings.openai.embeddings.create')
+    def test_embed_many(self, mock_create):
+        """Test bulk embedding into a unit-norm float32 matrix."""
+        mock_create.side_effect = lambda input, model: Mock(
+            data=[Mock(embedding=[float(len(text)), 1.0]) for text in input]
+        )
+        self.service.MAX_BATCH_SIZE = 2
+        self.service.concurrency = 1
+        
+        matrix = self.service.embed_many(["a", "bb", "ccc"])
+        
+        self.assertEqual(matrix.dtype, np.float32)
+        expected = np.array([[1, 1], [2, 1], [3, 1]], dtype=np.float32)
+        expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+        np.testing.assert_allclose(matrix, expected, rtol=1e-6)
+        # Inputs are split into requests of at most MAX_BATCH_SIZE
+        self.assertEqual(mock_create.call_count, 2)
+        
+    @patch('mini_memori.embeddings.openai.AsyncOpenAI')
+    def test_embed_many_concurrent(self, mock_client_class):
+        """Test that multi-request bulk embedding runs requests concurrently."""
+        client = mock_client_class.return_value
+        client.close = AsyncMock()
+        client.embeddings.create = AsyncMock(side_effect=lambda input, model: Mock(
+            data=[Mock(embedding=[float(len(text)), 1.0]) for text in input]
+        ))
+        self.service.MAX_BATCH_SIZE = 2
+        
+        matrix = self.service.embed_many(["a", "bb", "ccc", "dddd", "eeeee"])
+        
+        self.assertEqual(matrix.shape, (5, 2))
+        # Rows stay in input order across requests
+        np.testing.assert_allclose(matrix[:, 0] / matrix[:, 1], [1, 2, 3, 4, 5], rtol=1e-5)
+        self.assertEqual(client.embeddings.create.await_count, 3)
+        client.close.assert_awaited_once()
+        
+    @patch('mini_memori.embeddings.openai.AsyncOpenAI')
+    def test_embed_many_async_reuses_client(self, mock_client_class):
+        """Test that async calls on one event loop share a client until aclose."""
+        client = mock_client_class.return_value
+        client.close = AsyncMock()
+        client.embeddings.create = AsyncMock(side_effect=lambda input, model: Mock(
+            data=[Mock(embedding=[1.0, 0.0]) for _ in input]
+        ))
+        
+        async def embed_twice():
+            await self.service.embed_many_async(["a"])
+            await self.service.embed_many_async(["b", "c"])
+            await self.service.aclose()
+            
+        with patch('mini_memori.embeddings.openai.base_url', "http://proxy.test/v1/"):
+            asyncio.run(embed_twice())
+            
+        mock_client_class.assert_called_once()
+        # Module-level openai settings carry over to the async client
+        self.assertEqual(mock_client_class.call_args.kwargs['base_url'], "http://proxy.test/v1/")
+        self.assertEqual(client.embeddings.create.await_count, 2)
+        client.close.assert_awaited_once()
+        
+    def test_embed_many_empty_text(self):
+        """Test that an empty text in the batch raises error."""
+        with self.assertRaises(ValueError):
+            self.service.embed_many(["text", " "])
+            
     def test_cosine_similarity_identical(self):
         """Test cosine similarity of identical vectors."""
         vec = [1.0, 2.0, 3.0]
@@ -99,6 +168,13 @@ class TestEmbeddingService(unittest.TestCase):
         similarity = EmbeddingService.cosine_similarity(vec1, vec2)
         self.assertEqual(similarity, 0.0)
         
+    def test_cosine_similarity_normalized(self):
+        """Test the dot-product path for unit vectors."""
+        vec1 = [0.6, 0.8]
+        vec2 = [1.0, 0.0]
+        similarity = EmbeddingService.cosine_similarity(vec1, vec2, assume_normalized=True)
+        self.assertAlmostEqual(similarity, 0.6, places=6)
+        
     def test_find_most_similar(self):
         """Test finding most similar embeddings."""
         query = [1.0, 0.0, 0.0]
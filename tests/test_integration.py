@@ -5,51 +5,72 @@ Tests the full memory engine workflow.
 """
 
 import unittest
+import array
+import asyncio
 import os
 import tempfile
-from unittest.mock import Mock, patch
-from mini_memori import MemoryEngine
+import threading
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+from mini_memori import MemoryEngine, Message
+from mini_memori.chatbot import MemoriChatbot
 
 
 class TestMemoryEngineIntegration(unittest.TestCase):
     """Integration tests for the complete memory engine."""
     
-    def setUp(self):
-        """Set up test environment."""
-        # Create temporary database
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
-        self.temp_db.close()
+    @classmethod
+    def setUpClass(cls):
+        """Mock OpenAI API calls once for the whole class."""
+        patcher = patch('mini_memori.embeddings.openai.embeddings.create')
+        cls.mock_openai = patcher.start()
+        cls.addClassCleanup(patcher.stop)
         
-        # Mock OpenAI API calls
-        self.patcher = patch('mini_memori.embeddings.openai.embeddings.create')
-        self.mock_openai = self.patcher.start()
+        # One prebuilt float32 embedding buffer, returned for every input.
+        # All mock embeddings point the same way, so every pair has
+        # similarity 1
+        item = SimpleNamespace(embedding=array.array('f', [0.01]) * 1536)
         
-        # Mock embeddings response
         def create_mock_embedding(input, model):
-            # Generate simple embeddings based on text length
             if isinstance(input, list):
-                return Mock(data=[
-                    Mock(embedding=[float(len(text)) / 100] * 1536) 
-                    for text in input
-                ])
-            else:
-                return Mock(data=[Mock(embedding=[float(len(input)) / 100] * 1536)])
+                return SimpleNamespace(data=[item] * len(input))
+            return SimpleNamespace(data=[item])
+            
+        cls.mock_openai.side_effect = create_mock_embedding
         
-        self.mock_openai.side_effect = create_mock_embedding
+        # Async requests go through the same mock, so call counts cover both
+        async_patcher = patch('mini_memori.embeddings.openai.AsyncOpenAI')
+        client = async_patcher.start().return_value
+        cls.addClassCleanup(async_patcher.stop)
+        client.embeddings.create = AsyncMock(
+            side_effect=lambda input, model: cls.mock_openai(input=input, model=model)
+        )
+        client.close = AsyncMock()
         
-        # Create engine
+    def setUp(self):
+        """Set up test environment."""
+        # Call counts start from zero in every test
+        self.mock_openai.reset_mock()
+        
+        # Create engine on an in-memory database, without durability
         self.engine = MemoryEngine(
-            db_path=self.temp_db.name,
-            api_key="test_key"
+            db_path=":memory:",
+            api_key="test_key",
+            journal_mode="memory",
+            synchronous="off"
         )
         
     def tearDown(self):
         """Clean up after tests."""
-        self.patcher.stop()
         self.engine.close()
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
-            
+        
+    def _file_path(self) -> str:
+        """Return a database path in a temporary directory removed after the test."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        return os.path.join(tmp_dir.name, "test.db")
+        
     def test_save_and_retrieve_single_message(self):
         """Test saving and retrieving a single message."""
         # Save message
@@ -81,14 +102,15 @@ class TestMemoryEngineIntegration(unittest.TestCase):
             ("user", "I enjoy hiking on weekends"),
         ]
         
-        # Save all messages
-        for role, content in messages:
-            self.engine.save_message(
-                role=role,
-                content=content,
-                conversation_id="test_conv"
-            )
-            
+        # Save all messages, committed once
+        with self.engine.db.batch():
+            for role, content in messages:
+                self.engine.save_message(
+                    role=role,
+                    content=content,
+                    conversation_id="test_conv"
+                )
+                
         # Retrieve programming-related
         memories = self.engine.retrieve_memories(
             query="programming languages",
@@ -99,6 +121,63 @@ class TestMemoryEngineIntegration(unittest.TestCase):
         # Should find relevant messages
         self.assertGreater(len(memories), 0)
         
+    def test_save_messages_batch(self):
+        """Test saving a batch of messages with embeddings."""
+        msg_ids = self.engine.save_messages([
+            {"role": "user", "content": "I love Python programming", "conversation_id": "test_conv"},
+            {"role": "assistant", "content": "Python is a great language!", "conversation_id": "test_conv"},
+            Message("user", "Unfiled message"),
+        ])
+        
+        self.assertEqual(len(msg_ids), 3)
+        # All messages are embedded with a single API call
+        self.assertEqual(self.mock_openai.call_count, 1)
+        self.assertEqual(len(self.engine.get_conversation_history("test_conv")), 2)
+        self.assertEqual(len(self.engine.get_conversation_history("default")), 1)
+        
+        stats = self.engine.get_statistics()
+        self.assertEqual(stats['total_embeddings'], 3)
+        
+    def test_save_message_async(self):
+        """Test that concurrent async saves share one embeddings request."""
+        async def save_all(count):
+            return await asyncio.gather(*(
+                self.engine.save_message_async("user", f"Message {i}", "test_conv")
+                for i in range(count)
+            ))
+            
+        # The database is only used from the event loop's thread
+        cache_threads = []
+        cache_embeddings = self.engine.db.cache_embeddings
+        
+        def record_thread(*args):
+            cache_threads.append(threading.get_ident())
+            return cache_embeddings(*args)
+            
+        with patch.object(self.engine.db, 'cache_embeddings', side_effect=record_thread):
+            message_ids = asyncio.run(save_all(5))
+        self.assertEqual(cache_threads, [threading.get_ident()])
+        self.assertEqual(len(set(message_ids)), 5)
+        self.assertEqual(self.mock_openai.call_count, 1)
+        self.assertEqual(self.engine.get_statistics()['total_embeddings'], 5)
+        
+        # A full queue is flushed without waiting for the window
+        self.engine.EMBED_BATCH_SIZE = 2
+        self.engine.embedding_cache = False
+        asyncio.run(save_all(5))
+        self.assertEqual(self.mock_openai.call_count, 4)
+        self.assertEqual(self.engine.get_statistics()['total_embeddings'], 10)
+        
+    def test_save_messages_invalid(self):
+        """Test that an invalid message rejects the whole batch."""
+        with self.assertRaises(ValueError):
+            self.engine.save_messages([
+                {"role": "user", "content": "Valid message"},
+                {"role": "user", "content": ""},
+            ])
+            
+        self.assertEqual(self.engine.get_statistics()['total_messages'], 0)
+        
     def test_conversation_history(self):
         """Test getting conversation history."""
         messages = [
@@ -107,13 +186,14 @@ class TestMemoryEngineIntegration(unittest.TestCase):
             ("user", "How are you?"),
         ]
         
-        for role, content in messages:
-            self.engine.save_message(
-                role=role,
-                content=content,
-                conversation_id="test_conv"
-            )
-            
+        with self.engine.db.batch():
+            for role, content in messages:
+                self.engine.save_message(
+                    role=role,
+                    content=content,
+                    conversation_id="test_conv"
+                )
+                
         # Get history
         history = self.engine.get_conversation_history("test_conv")
         
@@ -124,13 +204,10 @@ class TestMemoryEngineIntegration(unittest.TestCase):
     def test_clear_conversation(self):
         """Test clearing a conversation."""
         # Add messages
-        for i in range(5):
-            self.engine.save_message(
-                role="user",
-                content=f"Message {i}",
-                conversation_id="test_conv"
-            )
-            
+        self.engine.save_messages([
+            Message("user", f"Message {i}", "test_conv") for i in range(5)
+        ])
+        
         # Clear
         count = self.engine.clear_conversation("test_conv")
         self.assertEqual(count, 5)
@@ -142,20 +219,37 @@ class TestMemoryEngineIntegration(unittest.TestCase):
     def test_statistics(self):
         """Test getting statistics."""
         # Add messages to multiple conversations
-        for conv_id in ["conv1", "conv2"]:
-            for i in range(3):
-                self.engine.save_message(
-                    role="user",
-                    content=f"Message {i}",
-                    conversation_id=conv_id
-                )
-                
+        with self.engine.db.batch():
+            for conv_id in ["conv1", "conv2"]:
+                for i in range(3):
+                    self.engine.save_message(
+                        role="user",
+                        content=f"Message {i}",
+                        conversation_id=conv_id
+                    )
+                    
         stats = self.engine.get_statistics()
         
         self.assertEqual(stats['total_messages'], 6)
         self.assertEqual(stats['total_conversations'], 2)
         self.assertEqual(stats['total_embeddings'], 6)
         
+        # Later writes update the counters without another database scan
+        with patch.object(self.engine.db, 'get_statistics') as scan:
+            self.engine.save_message(role="user", content="New", conversation_id="conv3")
+            self.engine.save_messages([Message("user", "More", "conv1")], generate_embeddings=False)
+            stats = self.engine.get_statistics()
+            scan.assert_not_called()
+            
+        self.assertEqual(stats['total_messages'], 8)
+        self.assertEqual(stats['total_conversations'], 3)
+        self.assertEqual(stats['total_embeddings'], 7)
+        
+        self.engine.clear_conversation("conv1")
+        stats = self.engine.get_statistics()
+        self.assertEqual(stats['total_messages'], 4)
+        self.assertEqual(stats['total_conversations'], 2)
+        
     def test_message_with_metadata(self):
         """Test saving and retrieving messages with metadata."""
         metadata = {"source": "test", "importance": "high"}
@@ -196,6 +290,242 @@ class TestMemoryEngineIntegration(unittest.TestCase):
         # Just verify it returns a list
         self.assertIsInstance(memories, list)
         
+    def test_retrieve_uses_query_cache(self):
+        """Test that repeated queries are served from the cache."""
+        self.engine.save_message(
+            role="user",
+            content="My favorite color is blue",
+            conversation_id="test_conv"
+        )
+        calls = self.mock_openai.call_count
+        
+        first = self.engine.retrieve_memories("favorite color", conversation_id="test_conv")
+        second = self.engine.retrieve_memories("favorite color", conversation_id="test_conv")
+        
+        self.assertEqual(first, second)
+        # Only the first query needs an embedding
+        self.assertEqual(self.mock_openai.call_count, calls + 1)
+        
+        # Writes invalidate cached results
+        self.engine.save_message(
+            role="user",
+            content="I also like green",
+            conversation_id="test_conv"
+        )
+        third = self.engine.retrieve_memories("favorite color", conversation_id="test_conv")
+        self.assertEqual(len(third), 2)
+        
+    def test_query_cache_rescores(self):
+        """Test that cached results are scored against the new query."""
+        self.engine.save_message(role="user", content="I like tea", conversation_id="test_conv")
+        
+        # A query 0.98 similar to both the stored embedding and the first query
+        stored = np.full(1536, 1 / np.sqrt(1536), dtype=np.float32)
+        tilt = np.zeros(1536, dtype=np.float32)
+        tilt[:2] = [1 / np.sqrt(2), -1 / np.sqrt(2)]
+        similar = (0.98 * stored + np.sqrt(1 - 0.98 ** 2) * tilt).astype(np.float32)
+        
+        with patch.object(self.engine, '_embed', side_effect=[stored, similar]):
+            first = self.engine.retrieve_memories("tea", conversation_id="test_conv")
+            second = self.engine.retrieve_memories("tea please", conversation_id="test_conv")
+            
+        self.assertAlmostEqual(first[0]['similarity'], 1.0, places=4)
+        self.assertEqual(second[0]['id'], first[0]['id'])
+        self.assertAlmostEqual(second[0]['similarity'], 0.98, places=4)
+        
+    def test_query_cache_hybrid(self):
+        """Test that hybrid results are only reused for the same query text."""
+        if not self.engine.db.fts_enabled:
+            self.skipTest("FTS5 not available")
+            
+        self.engine.save_messages([
+            {"role": "user", "content": "My favorite food is pizza", "conversation_id": "test_conv"},
+            {"role": "user", "content": "I enjoy hiking", "conversation_id": "test_conv"},
+        ])
+        
+        # Every mock query embedding is identical, so only the text differs
+        pizza = self.engine.retrieve_memories("pizza", conversation_id="test_conv", hybrid=True)
+        hiking = self.engine.retrieve_memories("hiking", conversation_id="test_conv", hybrid=True)
+        
+        self.assertEqual(pizza[0]['content'], "My favorite food is pizza")
+        self.assertEqual(hiking[0]['content'], "I enjoy hiking")
+            
+    def test_query_cache_disabled(self):
+        """Test that a cache size of 0 disables query caching."""
+        with MemoryEngine(
+            db_path=":memory:",
+            api_key="test_key",
+            query_cache_size=0,
+            embedding_cache=False
+        ) as engine:
+            engine.save_message(role="user", content="Test message", conversation_id="test_conv")
+            calls = self.mock_openai.call_count
+            
+            engine.retrieve_memories("test", conversation_id="test_conv")
+            engine.retrieve_memories("test", conversation_id="test_conv")
+            
+            self.assertEqual(self.mock_openai.call_count, calls + 2)
+            
+    def test_matrix_cache(self):
+        """Test that the linear scan reuses its embedding matrix until a write."""
+        engine = MemoryEngine(db_path=":memory:", api_key="test_key", query_cache_size=0)
+        self.addCleanup(engine.close)
+        
+        with patch.object(engine.db, 'search_embeddings', return_value=None), \
+                patch.object(engine.db, 'load_embedding_matrix', wraps=engine.db.load_embedding_matrix) as load:
+            engine.save_message(role="user", content="I like tea", conversation_id="test_conv")
+            engine.retrieve_memories("tea", conversation_id="test_conv")
+            engine.retrieve_memories("drinks", conversation_id="test_conv")
+            self.assertEqual(load.call_count, 1)
+            
+            engine.save_message(role="user", content="I like coffee", conversation_id="test_conv")
+            memories = engine.retrieve_memories("drinks", conversation_id="test_conv")
+            self.assertEqual(load.call_count, 2)
+            self.assertEqual(len(memories), 2)
+            
+    def test_retrieve_async(self):
+        """Test async retrieval, preloading the scan matrix during the query request."""
+        self.engine.save_message(role="user", content="I like tea", conversation_id="test_conv")
+        
+        with patch.object(self.engine.db, 'search_embeddings', return_value=None), \
+                patch.object(type(self.engine.db), 'knn_enabled', False):
+            memories = asyncio.run(
+                self.engine.retrieve_memories_async("drinks", conversation_id="test_conv")
+            )
+            
+        self.assertEqual([m['content'] for m in memories], ["I like tea"])
+        self.assertIn(("test_conv", 1536), self.engine._matrix_cache)
+        self.assertEqual(self.engine.retrieve_memories("drinks", conversation_id="test_conv"), memories)
+        
+    def test_retrieve_async_during_saves(self):
+        """Test async retrieval running alongside async saves."""
+        # On disk, so the database can have a read pool
+        self.engine.close()
+        self.engine = MemoryEngine(db_path=self._file_path(), api_key="test_key", read_connections=2)
+        self.engine.save_message(role="user", content="I like tea", conversation_id="test_conv")
+        
+        async def retrieve_while_saving():
+            return await asyncio.gather(
+                self.engine.retrieve_memories_async("drinks", conversation_id="test_conv"),
+                *(
+                    self.engine.save_message_async("user", f"I like drink {i}", "test_conv")
+                    for i in range(3)
+                )
+            )
+            
+        db = self.engine.db
+        load_matrix = db.load_embedding_matrix
+        load_threads = []
+        
+        def record_thread(*args):
+            load_threads.append(threading.get_ident())
+            return load_matrix(*args)
+            
+        with patch.object(db, 'search_embeddings', return_value=None), \
+                patch.object(type(db), 'knn_enabled', False), \
+                patch.object(db, 'load_embedding_matrix', side_effect=record_thread) as load:
+            memories = asyncio.run(retrieve_while_saving())[0]
+            self.assertIn("I like tea", [m['content'] for m in memories])
+            # The preload read committed rows through the read pool, in an
+            # executor thread
+            self.assertIs(load.call_args_list[0].args[2], True)
+            self.assertNotEqual(load_threads[0], threading.get_ident())
+            
+            # Saves landed while it loaded, so the preloaded matrix wasn't kept
+            memories = self.engine.retrieve_memories("drinks", top_k=5, conversation_id="test_conv")
+            
+        self.assertEqual(len(memories), 4)
+        
+    def test_quantized_scan(self):
+        """Test that quantized engines scan an int8 matrix."""
+        engine = MemoryEngine(
+            db_path=":memory:", api_key="test_key", quantize_embeddings=True
+        )
+        self.addCleanup(engine.close)
+        
+        with patch.object(engine.db, 'search_embeddings', return_value=None):
+            engine.save_message(role="user", content="I like tea", conversation_id="test_conv")
+            memories = engine.retrieve_memories("drinks", conversation_id="test_conv")
+            
+        self.assertEqual(len(memories), 1)
+        self.assertAlmostEqual(memories[0]['similarity'], 1.0, places=3)
+        self.assertEqual(engine._matrix_cache[("test_conv", 1536)][0].dtype, np.int8)
+        
+    def test_streamed_scan(self):
+        """Test that a batched scan ranks like the cached matrix scan."""
+        engine = MemoryEngine(
+            db_path=":memory:", api_key="test_key", query_cache_size=0, scan_batch_size=2
+        )
+        self.addCleanup(engine.close)
+        
+        with patch.object(engine.db, 'search_embeddings', return_value=None):
+            for i in range(5):
+                engine.save_message(role="user", content=f"Note {i}", conversation_id="test_conv")
+            streamed = engine.retrieve_memories("notes", top_k=3, conversation_id="test_conv")
+            engine.scan_batch_size = None
+            cached = engine.retrieve_memories("notes", top_k=3, conversation_id="test_conv")
+            
+        self.assertEqual([m['id'] for m in streamed], [m['id'] for m in cached])
+        self.assertEqual(len(streamed), 3)
+        
+    def test_dedup(self):
+        """Test that near-duplicate messages refresh the existing row."""
+        engine = MemoryEngine(db_path=":memory:", api_key="test_key", dedup_threshold=0.95)
+        self.addCleanup(engine.close)
+        
+        # Mock embeddings all point the same way, so every pair is a duplicate
+        first = engine.save_message(role="user", content="What's my name?", conversation_id="a")
+        engine.db.conn.execute("UPDATE messages SET timestamp = '2024-01-01 00:00:00'")
+        again = engine.save_message(role="user", content="what's my name?", conversation_id="a")
+        self.assertEqual(again, first)
+        # Folding keeps the original timestamp, in step with id order
+        self.assertEqual(engine.get_conversation_history("a")[0]['timestamp'], "2024-01-01 00:00:00")
+        
+        reply, repeat = engine.save_messages([
+            Message("assistant", "Alice", "a"),
+            Message("user", "What is my name?", "a")
+        ])
+        self.assertNotEqual(reply, first)
+        self.assertEqual(repeat, first)
+        self.assertNotEqual(engine.save_message(role="user", content="Hi", conversation_id="b"), first)
+        
+        history = engine.get_conversation_history("a")
+        self.assertEqual([m['content'] for m in history], ["What is my name?", "Alice"])
+        self.assertEqual(engine.get_statistics()['total_embeddings'], 3)
+        
+    def test_embedding_cache(self):
+        """Test that identical text is only embedded once."""
+        # On disk, so a second engine can open the same database
+        self.engine.close()
+        self.engine = MemoryEngine(db_path=self._file_path(), api_key="test_key")
+        
+        self.engine.save_messages([
+            {"role": "user", "content": "Hello there"},
+            {"role": "user", "content": "Hello there"},
+            {"role": "user", "content": "Goodbye"},
+        ])
+        self.assertEqual(self.mock_openai.call_count, 1)
+        self.assertEqual(self.mock_openai.call_args.kwargs['input'], ["Hello there", "Goodbye"])
+        
+        # Hot text is served from memory without a database lookup
+        with patch.object(self.engine.db, 'get_cached_embeddings') as lookup:
+            self.engine.save_message(role="user", content="Hello there")
+            lookup.assert_not_called()
+            
+        # The cache persists in the database across engines
+        with MemoryEngine(db_path=self.engine.db_path, api_key="test_key") as engine:
+            engine.save_message(role="user", content="Goodbye")
+            
+        self.assertEqual(self.mock_openai.call_count, 1)
+        self.assertEqual(self.engine.get_statistics()['total_embeddings'], 5)
+        
+        # Query embeddings stay in memory; the database cache only holds stored content
+        with patch.object(self.engine.db, 'cache_embeddings') as store:
+            self.engine.retrieve_memories("Anything new?")
+            asyncio.run(self.engine.retrieve_memories_async("Anything else?"))
+            store.assert_not_called()
+        self.assertEqual(self.mock_openai.call_count, 3)
+        
     def test_keyword_search(self):
         """Test keyword-based search."""
         messages = [
@@ -204,13 +534,14 @@ class TestMemoryEngineIntegration(unittest.TestCase):
             "My favorite food is pizza"
         ]
         
-        for msg in messages:
-            self.engine.save_message(
-                role="user",
-                content=msg,
-                conversation_id="test_conv"
-            )
-            
+        with self.engine.db.batch():
+            for msg in messages:
+                self.engine.save_message(
+                    role="user",
+                    content=msg,
+                    conversation_id="test_conv"
+                )
+                
         # Search for keyword
         results = self.engine.search_by_keyword(
             keyword="Python",
@@ -220,9 +551,91 @@ class TestMemoryEngineIntegration(unittest.TestCase):
         self.assertEqual(len(results), 1)
         self.assertIn("Python", results[0]['content'])
         
+        # Without a conversation filter only "default" is searched
+        self.engine.save_message(role="user", content="More python", conversation_id="other")
+        self.engine.save_message(role="user", content="Default python")
+        results = self.engine.search_by_keyword(keyword="python")
+        self.assertEqual([r['content'] for r in results], ["Default python"])
+        
+    def test_retrieve_hybrid(self):
+        """Test blending keyword and semantic scores."""
+        self.engine.save_messages([
+            {"role": "user", "content": "My favorite food is pizza", "conversation_id": "test_conv"},
+            {"role": "user", "content": "I enjoy hiking", "conversation_id": "test_conv"},
+        ])
+        
+        memories = self.engine.retrieve_memories(
+            query="pizza",
+            conversation_id="test_conv",
+            hybrid=True
+        )
+        
+        self.assertEqual(len(memories), 2)
+        if self.engine.db.fts_enabled:
+            # Mock embeddings are all parallel, so the keyword match decides
+            self.assertEqual(memories[0]['content'], "My favorite food is pizza")
+            self.assertAlmostEqual(memories[0]['similarity'], 1.0, places=4)
+            self.assertAlmostEqual(memories[1]['similarity'], 0.6, places=4)
+            
+    def test_chatbot_turn(self):
+        """Test that a chat turn embeds each message once and saves both sides."""
+        chatbot = MemoriChatbot(memory_engine=self.engine, conversation_id="chat")
+        
+        with patch('mini_memori.chatbot.openai.chat.completions.create') as mock_chat:
+            mock_chat.return_value = Mock(choices=[Mock(message=Mock(content="Hi Alice!"))])
+            self.assertEqual(chatbot.chat("My name is Alice"), "Hi Alice!")
+            
+        # One call for the query, one for the reply
+        self.assertEqual(self.mock_openai.call_count, 2)
+        self.assertEqual(self.mock_openai.call_args.kwargs['input'], ["Hi Alice!"])
+        
+        # The current message is sent once, after the history
+        prompt = mock_chat.call_args.kwargs['messages']
+        self.assertEqual([m['content'] for m in prompt].count("My name is Alice"), 1)
+        self.assertEqual(prompt[-1], {"role": "user", "content": "My name is Alice"})
+        
+        history = self.engine.get_conversation_history("chat")
+        self.assertEqual([(m['role'], m['content']) for m in history], [
+            ("user", "My name is Alice"),
+            ("assistant", "Hi Alice!"),
+        ])
+        self.assertEqual(self.engine.get_statistics()['total_embeddings'], 2)
+        
+        # Later turns keep the system prompt and history as a stable prefix,
+        # with retrieved memories after the new message
+        with patch('mini_memori.chatbot.openai.chat.completions.create') as mock_chat:
+            mock_chat.return_value = Mock(choices=[Mock(message=Mock(content="Alice."))])
+            chatbot.chat("What is my name?")
+            
+        second = mock_chat.call_args.kwargs['messages']
+        self.assertEqual(second[:len(prompt)], prompt)
+        self.assertEqual(second[len(prompt)]['content'], "Hi Alice!")
+        self.assertEqual(second[-2], {"role": "user", "content": "What is my name?"})
+        self.assertEqual(second[-1]['role'], "user")
+        self.assertTrue(second[-1]['content'].startswith("<memories>\n"))
+        
+        # Conversations with the same prompt and model share a prompt cache key
+        key = mock_chat.call_args.kwargs['extra_body']['prompt_cache_key']
+        other = MemoriChatbot(memory_engine=self.engine, conversation_id="other")
+        self.assertEqual(other.prompt_cache_key, key)
+        other = MemoriChatbot(memory_engine=self.engine, chat_model="gpt-4o")
+        self.assertNotEqual(other.prompt_cache_key, key)
+        
+    def test_chatbot_turn_api_error(self):
+        """Test that the user's message is kept when the completion fails."""
+        chatbot = MemoriChatbot(memory_engine=self.engine, conversation_id="chat")
+        
+        with patch('mini_memori.chatbot.openai.chat.completions.create') as mock_chat:
+            mock_chat.side_effect = RuntimeError("rate limited")
+            reply = chatbot.chat("My name is Alice")
+            
+        self.assertIn("rate limited", reply)
+        history = self.engine.get_conversation_history("chat")
+        self.assertEqual([(m['role'], m['content']) for m in history], [("user", "My name is Alice")])
+        
     def test_context_manager(self):
         """Test using engine as context manager."""
-        with MemoryEngine(db_path=self.temp_db.name, api_key="test_key") as engine:
+        with MemoryEngine(db_path=self._file_path(), api_key="test_key") as engine:
             msg_id = engine.save_message(
                 role="user",
                 content="Test message",
@@ -0,0 +1,167 @@
+"""
+Unit tests for Mini Memori similarity kernels.
+"""
+
+import unittest
+from unittest.mock import patch
+import numpy as np
+from mini_memori import kernels
+from mini_memori.kernels import (
+    cosine_scores, int8_cosine_scores, int8_norms, normalize, quantize_int8,
+    score_and_filter, top_k_indices
+)
+
+
+class TestKernels(unittest.TestCase):
+    """Test cases for similarity kernels."""
+    
+    def test_cosine_scores(self):
+        """Test scoring a query against a matrix."""
+        matrix = np.array([
+            [1.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0],
+            [2.0, 2.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [-1.0, 0.0, 0.0],
+        ], dtype=np.float32)
+        query = np.array([3.0, 0.0, 0.0], dtype=np.float32)
+        
+        scores = cosine_scores(matrix, query)
+        
+        np.testing.assert_allclose(scores, [1.0, 0.0, np.sqrt(0.5), 0.0, 0.0], atol=1e-5)
+        
+    def test_cosine_scores_normalized(self):
+        """Test the dot-product path for unit-norm inputs."""
+        matrix = normalize(np.array([[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]))
+        query = normalize(np.array([2.0, 0.0]))
+        
+        np.testing.assert_allclose(
+            cosine_scores(matrix, query, normalized=True),
+            cosine_scores(matrix, query),
+            atol=1e-6
+        )
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), [1.0, 1.0, 0.0], atol=1e-6)
+        
+    def test_dot_kernel(self):
+        """Test the dimension-specialized Numba kernel."""
+        if kernels.numba is None:
+            self.assertIsNone(kernels.dot_kernel(4))
+            self.skipTest("numba not installed")
+            
+        rng = np.random.default_rng(0)
+        matrix = normalize(rng.normal(size=(50, 4)))
+        query = normalize(rng.normal(size=4))
+        
+        with patch.object(kernels, 'simsimd', None):
+            scores = cosine_scores(matrix, query, normalized=True)
+            with self.assertRaises(ValueError):
+                cosine_scores(matrix, query[:3], normalized=True)
+                
+        np.testing.assert_allclose(scores, np.clip(matrix @ query, 0.0, 1.0), atol=1e-5)
+        self.assertIs(kernels.dot_kernel(4), kernels.dot_kernel(4))
+        
+    def test_cosine_kernel(self):
+        """Test the fused dot-and-norm Numba kernel against the BLAS path."""
+        if kernels.numba is None:
+            self.assertIsNone(kernels.cosine_kernel(4))
+            self.skipTest("numba not installed")
+            
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(50, 4)).astype(np.float32)
+        matrix[0] = 0.0
+        query = rng.normal(size=4).astype(np.float32)
+        
+        with patch.object(kernels, 'simsimd', None):
+            scores = cosine_scores(matrix, query)
+            with patch.object(kernels, 'numba', None):
+                expected = cosine_scores(matrix, query)
+                
+        np.testing.assert_allclose(scores, expected, atol=1e-5)
+        self.assertEqual(scores[0], 0.0)
+        
+    def test_int8_cosine_scores(self):
+        """Test integer scoring against float cosine similarity."""
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(40, 256)).astype(np.float32)
+        query = rng.normal(size=256).astype(np.float32)
+        codes = np.stack([quantize_int8(row)[0] for row in matrix])
+        codes[0] = 0
+        
+        expected = cosine_scores(matrix, query)
+        expected[0] = 0.0
+        np.testing.assert_allclose(int8_cosine_scores(codes, query), expected, atol=0.02)
+        
+        # Compiled (if Numba is installed) fallback, with and without precomputed norms
+        with patch.object(kernels, 'simsimd', None):
+            np.testing.assert_allclose(int8_cosine_scores(codes, query), expected, atol=0.02)
+            np.testing.assert_allclose(
+                int8_cosine_scores(codes, query, int8_norms(codes)), expected, atol=0.02
+            )
+            
+            # Integer dot products are exact, so NumPy gives the same scores
+            compiled = int8_cosine_scores(codes, query)
+            with patch.object(kernels, 'numba', None):
+                np.testing.assert_array_equal(int8_cosine_scores(codes, query), compiled)
+                
+    def test_quantize_int8(self):
+        """Test rounding a vector to int8 codes and a scale."""
+        codes, scale = quantize_int8(np.array([0.5, -1.0, 0.25]))
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(codes.tolist(), [64, -127, 32])
+        self.assertAlmostEqual(scale, 1.0 / 127)
+        self.assertEqual(quantize_int8(np.zeros(2))[0].tolist(), [0, 0])
+        
+    def test_cosine_scores_empty(self):
+        """Test scoring an empty matrix."""
+        scores = cosine_scores(np.empty((0, 3), dtype=np.float32), np.ones(3, dtype=np.float32))
+        self.assertEqual(scores.shape, (0,))
+        
+    def test_top_k_indices(self):
+        """Test selecting the highest scores in descending order."""
+        scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+        self.assertEqual(top_k_indices(scores, 3).tolist(), [1, 3, 2])
+        
+    def test_top_k_indices_threshold(self):
+        """Test that scores below the threshold are dropped."""
+        scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+        self.assertEqual(top_k_indices(scores, 10, threshold=0.5).tolist(), [1, 3, 2])
+        self.assertEqual(top_k_indices(scores, 10, threshold=0.95).tolist(), [])
+        
+    def test_top_k_indices_ties(self):
+        """Test that ties keep their original order."""
+        scores = np.array([0.5, 1.0, 0.5, 0.5, 1.0])
+        self.assertEqual(top_k_indices(scores, 3).tolist(), [1, 4, 0])
+        self.assertEqual(top_k_indices(scores, 5).tolist(), [1, 4, 0, 2, 3])
+        
+    def test_top_k_indices_heap(self):
+        """Test that the Numba heap selection matches the NumPy path."""
+        if kernels.numba is None:
+            self.skipTest("numba not installed")
+            
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            scores = np.round(rng.random(int(rng.integers(0, 40))), 1).astype(np.float32)
+            top_k = int(rng.integers(1, 8))
+            threshold = float(rng.random() * 0.5)
+            with patch.object(kernels, 'numba', None):
+                expected = top_k_indices(scores, top_k, threshold).tolist()
+            self.assertEqual(top_k_indices(scores, top_k, threshold).tolist(), expected)
+            
+    def test_score_and_filter(self):
+        """Test thresholding similarity scores alone."""
+        sims = np.array([0.1, 0.9, 0.5, 0.7])
+        indices, scores = score_and_filter(sims, 0.5)
+        self.assertEqual(indices.tolist(), [1, 2, 3])
+        np.testing.assert_allclose(scores, sims)
+        
+    def test_score_and_filter_blend(self):
+        """Test blending similarity with keyword scores."""
+        sims = np.array([1.0, 0.0, 0.5])
+        bm25 = np.array([0.0, 1.0, 0.5])
+        indices, scores = score_and_filter(sims, 0.45, bm25=bm25, alpha=0.6)
+        np.testing.assert_allclose(scores, [0.6, 0.4, 0.5])
+        self.assertEqual(indices.tolist(), [0, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
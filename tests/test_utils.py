@@ -3,14 +3,18 @@ Unit tests for Mini Memori utility functions.
 """
 
 import unittest
-from datetime import datetime
+from unittest.mock import MagicMock, patch
+from mini_memori import utils
 from mini_memori.utils import (
     format_timestamp,
     truncate_text,
     estimate_tokens,
+    format_memory_output,
+    prepare_context_window,
     sanitize_conversation_id,
     validate_message_data,
     create_message_dict,
+    create_message_dicts,
 )
 
 
@@ -51,9 +55,47 @@ class TestUtils(unittest.TestCase):
     def test_estimate_tokens(self):
         """Test token estimation."""
         text = "A" * 400  # ~100 tokens
-        result = estimate_tokens(text)
+        with patch.object(utils, '_encoding', return_value=None):
+            result = estimate_tokens(text)
         self.assertEqual(result, 100)
         
+    def test_estimate_tokens_bytes(self):
+        """Test estimating tokens of UTF-8 bytes."""
+        with patch.object(utils, '_encoding', return_value=None):
+            self.assertEqual(estimate_tokens(b"A" * 400), 100)
+            self.assertEqual(estimate_tokens(bytearray(b"A" * 40)), 10)
+            
+        encoding = MagicMock()
+        encoding.encode.side_effect = lambda text, **kwargs: text.split()
+        with patch.object(utils, '_encoding', return_value=encoding):
+            self.assertEqual(estimate_tokens("café au lait".encode('utf-8')), 3)
+        self.assertEqual(encoding.encode.call_args.args[0], "café au lait")
+        
+    def test_token_counts_with_encoder(self):
+        """Test that an encoder, when available, gives the counts."""
+        encoding = MagicMock()
+        encoding.encode.side_effect = lambda text, **kwargs: text.split()
+        encoding.encode_batch.side_effect = lambda texts, **kwargs: [t.split() for t in texts]
+        memories = [{'content': "one two"}, {'content': "three"}, {'content': "four five"}]
+        
+        with patch.object(utils, '_encoding', return_value=encoding):
+            self.assertEqual(estimate_tokens("a b c"), 3)
+            self.assertEqual(prepare_context_window(memories, max_tokens=3), memories[:2])
+            
+        encoding.encode_batch.assert_called_once()
+        
+    def test_format_memory_output_metadata(self):
+        """Test that metadata prints the same with or without orjson."""
+        memories = [{
+            'role': 'user', 'content': "Hi", 'similarity': 0.5,
+            'metadata': {'source': "test", 'tags': ["a", "b"]}
+        }]
+        output = format_memory_output(memories, include_metadata=True)
+        
+        with patch.object(utils, 'orjson', None):
+            self.assertEqual(format_memory_output(memories, include_metadata=True), output)
+        self.assertIn('"source": "test"', output)
+        
     def test_sanitize_conversation_id_valid(self):
         """Test sanitizing valid conversation ID."""
         conv_id = "valid_conversation-123"
@@ -66,6 +108,17 @@ class TestUtils(unittest.TestCase):
         result = sanitize_conversation_id(conv_id)
         self.assertEqual(result, "conversation")
         
+    def test_sanitize_conversation_id_unicode(self):
+        """Test that non-ASCII letters and digits are kept."""
+        self.assertEqual(sanitize_conversation_id("café_日本-٣.x/y"), "café_日本-٣.xy")
+        
+    def test_sanitize_conversation_id_cached(self):
+        """Test that repeated IDs are served from the cache."""
+        sanitize_conversation_id("cached/id")
+        hits = sanitize_conversation_id.cache_info().hits
+        self.assertEqual(sanitize_conversation_id("cached/id"), "cachedid")
+        self.assertEqual(sanitize_conversation_id.cache_info().hits, hits + 1)
+        
     def test_sanitize_conversation_id_empty(self):
         """Test sanitizing empty ID."""
         result = sanitize_conversation_id("@#$%")
@@ -142,6 +195,18 @@ class TestUtils(unittest.TestCase):
         )
         
         self.assertEqual(result['metadata'], metadata)
+        
+    def test_create_message_dicts(self):
+        """Test that a batch of message dicts shares one timestamp."""
+        results = create_message_dicts([
+            ("user", "Hello", None),
+            ("assistant", "Hi", {"key": "value"}),
+        ])
+        
+        self.assertEqual([r['role'] for r in results], ["user", "assistant"])
+        self.assertEqual(results[0]['timestamp'], results[1]['timestamp'])
+        self.assertNotIn('metadata', results[0])
+        self.assertEqual(results[1]['metadata'], {"key": "value"})
 
 
 if __name__ == '__main__':
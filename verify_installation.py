@@ -8,6 +8,10 @@ import sys
 import os
 import importlib.util
 
+# OpenAI secret keys start with this prefix and are far longer than the minimum
+OPENAI_KEY_PREFIX = "sk-"
+OPENAI_KEY_MIN_LENGTH = 20
+
 
 def check_python_version():
     """Check Python version."""
@@ -52,7 +56,7 @@ def check_api_key():
         print("   Set it with: export OPENAI_API_KEY=your_key_here")
         return False
     
-    if api_key.startswith('sk-'):
+    if len(api_key) >= OPENAI_KEY_MIN_LENGTH and api_key.startswith(OPENAI_KEY_PREFIX):
         print("   ✅ API key is set")
         return True
     else:
@@ -70,16 +74,10 @@ def check_package_installation():
         print("   Install with: pip install -e .")
         return False
     
+    # Importing the package would load openai and numpy just to prove it
+    # exists; run_basic_test imports MemoryEngine when it actually needs it
     print("   ✅ mini_memori is installed")
-    
-    # Try importing main classes
-    try:
-        from mini_memori import MemoryEngine
-        print("   ✅ MemoryEngine imported successfully")
-        return True
-    except Exception as e:
-        print(f"   ❌ Error importing: {e}")
-        return False
+    return True
 
 
 def run_basic_test():
@@ -127,48 +125,72 @@ def run_basic_test():
         return False
 
 
+RULE = "=" * 60
+
+# Printed once all checks pass, as a single write
+NEXT_STEPS = f"""
+{RULE}
+🎉 Next Steps:
+{RULE}
+
+1. Set your OpenAI API key (if not already done):
+   export OPENAI_API_KEY=your_key_here
+
+2. Try the examples:
+   python examples/basic_usage.py
+
+3. Start the interactive chatbot:
+   python -m mini_memori.chatbot
+
+4. Read the documentation:
+   - README.md - Full documentation
+   - QUICKSTART.md - Quick start guide
+   - examples/ - Example scripts
+
+5. Run the tests:
+   pytest tests/
+
+"""
+
+
 def print_next_steps():
     """Print next steps for the user."""
-    print("\n" + "="*60)
-    print("🎉 Next Steps:")
-    print("="*60)
-    print("\n1. Set your OpenAI API key (if not already done):")
-    print("   export OPENAI_API_KEY=your_key_here")
-    print("\n2. Try the examples:")
-    print("   python examples/basic_usage.py")
-    print("\n3. Start the interactive chatbot:")
-    print("   python -m mini_memori.chatbot")
-    print("\n4. Read the documentation:")
-    print("   - README.md - Full documentation")
-    print("   - QUICKSTART.md - Quick start guide")
-    print("   - examples/ - Example scripts")
-    print("\n5. Run the tests:")
-    print("   pytest tests/")
-    print()
+    sys.stdout.write(NEXT_STEPS)
+
+
+# Checks run in order by main(), before the basic functionality test
+CHECKS = (
+    ("Python version", check_python_version),
+    ("Dependencies", check_dependencies),
+    ("Package installation", check_package_installation),
+    ("API key", check_api_key),
+)
 
 
 def main():
     """Main verification routine."""
-    print("\n" + "="*60)
-    print("🧠 Mini Memori - Installation Verification")
-    print("="*60)
-    
-    results = []
+    print(f"\n{RULE}\n🧠 Mini Memori - Installation Verification\n{RULE}")
     
     # Run checks
-    results.append(("Python version", check_python_version()))
-    results.append(("Dependencies", check_dependencies()))
-    results.append(("Package installation", check_package_installation()))
-    results.append(("API key", check_api_key()))
-    results.append(("Basic functionality", run_basic_test()))
+    results = [(name, check()) for name, check in CHECKS]
+    outcomes = dict(results)
+    
+    # The basic test imports the package (and openai with it); there's no
+    # point paying for that when it can't pass. None marks it as skipped
+    if outcomes["Package installation"] and outcomes["API key"]:
+        results.append(("Basic functionality", run_basic_test()))
+    else:
+        print("\n🧪 Skipping basic functionality test (fix the checks above first)")
+        results.append(("Basic functionality", None))
     
     # Summary
-    print("\n" + "="*60)
-    print("📊 Verification Summary:")
-    print("="*60)
+    print(f"\n{RULE}\n📊 Verification Summary:\n{RULE}")
     
     for name, passed in results:
-        status = "✅ PASS" if passed else "❌ FAIL"
+        if passed is None:
+            status = "⏭️  SKIP"
+        else:
+            status = "✅ PASS" if passed else "❌ FAIL"
         print(f"{status} - {name}")
     
     # Overall result